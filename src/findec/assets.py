@@ -1,5 +1,8 @@
 from dataclasses import dataclass
 
+import numpy as np
+import numpy.typing as npt
+
 
 @dataclass
 class Assets:
@@ -52,3 +55,78 @@ class Assets:
         # NB: We do not update the basis. Growth means we now have a taxable gain.
 
         self.tax_free = tax_free_risky_next + tax_free_safe_next
+
+
+@dataclass
+class AssetsBatch:
+    """Array counterpart of `Assets`: account i holds tax_free[i], taxable[i] and
+    taxable_basis[i]. `inflation_rate` may be one rate or one per account.
+    `taxable_basis` defaults to `taxable` (no unrealized gains), as for `Assets`.
+    Balances are held, and kept, in `dtype`."""
+
+    tax_free: np.ndarray
+    taxable: np.ndarray
+    inflation_rate: float | np.ndarray
+    taxable_basis: np.ndarray | None = None
+    dtype: npt.DTypeLike = np.float64
+
+    def __post_init__(self):
+        self.dtype = np.dtype(self.dtype)
+        self.tax_free = np.array(self.tax_free, dtype=self.dtype)
+        self.taxable = np.array(self.taxable, dtype=self.dtype)
+        if self.taxable_basis is None:
+            self.taxable_basis = self.taxable.copy()
+        else:
+            self.taxable_basis = np.array(self.taxable_basis, dtype=self.dtype)
+
+    @classmethod
+    def from_assets(
+        cls, assets: list[Assets], dtype: npt.DTypeLike = np.float64
+    ) -> "AssetsBatch":
+        return cls(
+            tax_free=[a.tax_free for a in assets],
+            taxable=[a.taxable for a in assets],
+            inflation_rate=np.array([a.inflation_rate for a in assets], dtype=float),
+            taxable_basis=[a.taxable_basis for a in assets],
+            dtype=dtype,
+        )
+
+    @property
+    def n_accounts(self) -> int:
+        return len(self.taxable)
+
+    def invest_in_taxable(self, amount: float | np.ndarray):
+        amount = np.asarray(amount, dtype=self.dtype)
+        self.taxable = self.taxable + amount
+        self.taxable_basis = self.taxable_basis + amount
+
+    def invest_in_tax_free(self, amount: float | np.ndarray):
+        self.tax_free = self.tax_free + np.asarray(amount, dtype=self.dtype)
+
+    @property
+    def total_wealth(self) -> np.ndarray:
+        return self.tax_free + self.taxable
+
+    def inflation_discount_factor(self, years_from_now: float) -> float | np.ndarray:
+        return (1 - np.asarray(self.inflation_rate)) ** years_from_now
+
+    def total_wealth_inflation_adjusted(self, years_from_now: float) -> np.ndarray:
+        return self.total_wealth * np.asarray(
+            self.inflation_discount_factor(years_from_now), dtype=self.dtype
+        )
+
+    def grow(
+        self,
+        *,
+        risk_free_rate: float | np.ndarray,
+        risky_returns: float | np.ndarray,
+        risky_asset_fraction: float | np.ndarray,
+    ):
+        """`Assets.grow` for every account at once; each argument may be one value or
+        one per account. The basis is not updated."""
+        growth = risky_asset_fraction * (1 + risky_returns) + (
+            1 - risky_asset_fraction
+        ) * (1 + risk_free_rate)
+        growth = np.asarray(growth, dtype=self.dtype)
+        self.taxable = self.taxable * growth
+        self.tax_free = self.tax_free * growth
@@ -0,0 +1,422 @@
+"""Vectorized Monte Carlo engine.
+
+Moves a batch of paths forward one year at a time as numpy arrays. Follows the same
+sequence of events as `findec.simulate.simulate_life_path`, so it gives the same
+distributions, but the random draws are not the same as the scalar engine's.
+"""
+
+from dataclasses import dataclass, fields
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+
+from findec.assets import Assets
+from findec.consumption import withdraw_taxable_first
+from findec.dataclasses import Preferences, State
+from findec.policy import PolicyRule, PolicyTable, build_policy_table
+from findec.profiling import stage_timer
+from findec.returns import RiskyAsset, DistributionType
+from findec.scenarios import ScenarioBank
+from findec.utility import crra_utility, bequest_utility
+from findec.survival import mortality_table
+
+
+@dataclass
+class StateBatch:
+    """Struct-of-arrays counterpart of `State`.
+
+    Every column has shape (n_ages, n_paths). Row i holds age `ages[i]`; rows after
+    a path's `last_index` are not part of that path and hold NaN. Columns are in the
+    simulation's dtype, except the float64 running totals.
+    """
+
+    ages: np.ndarray
+    last_index: np.ndarray
+    died: np.ndarray
+    tax_free: np.ndarray
+    taxable: np.ndarray
+    taxable_basis: np.ndarray
+    portfolio_value_post_inflation: np.ndarray
+    risky_return: np.ndarray
+    desired_consumption_pre_tax: np.ndarray
+    actual_consumption_post_tax: np.ndarray
+    consumption_post_tax_post_inflation: np.ndarray
+    consumption_fraction: np.ndarray
+    total_utility: np.ndarray
+    total_consumption: np.ndarray
+    annual_utility: np.ndarray
+    bequest_post_inflation: np.ndarray
+    run_offset: int = 0
+
+    @property
+    def n_paths(self) -> int:
+        return len(self.last_index)
+
+    @property
+    def recorded(self) -> np.ndarray:
+        return np.arange(len(self.ages))[:, None] <= self.last_index[None, :]
+
+    @property
+    def alive(self) -> np.ndarray:
+        death_row = np.arange(len(self.ages))[:, None] == self.last_index[None, :]
+        return ~(death_row & self.died[None, :])
+
+    def to_frame(self) -> pl.DataFrame:
+        """Long-format frame with the same columns as `simulate_life_paths`"""
+        recorded = self.recorded.T
+        n_rows_per_path = recorded.sum(axis=1)
+
+        columns = {}
+        for f in fields(State):
+            if f.name == "age":
+                values = np.broadcast_to(self.ages[None, :], recorded.shape)
+            elif f.name == "alive":
+                values = self.alive.T
+            else:
+                values = getattr(self, f.name).T
+            columns[f.name] = values[recorded]
+
+        df = pl.DataFrame(columns).with_columns(pl.selectors.float().fill_nan(None))
+        run_number = np.repeat(
+            np.arange(self.run_offset, self.run_offset + self.n_paths), n_rows_per_path
+        )
+        return df.with_columns(
+            pl.Series("run_number", run_number, dtype=pl.Int64()),
+        )
+
+
+@dataclass
+class YearStep:
+    """Accounts after one simulated year, and what the year's consumption was worth"""
+
+    tax_free: np.ndarray
+    taxable: np.ndarray
+    taxable_basis: np.ndarray
+    desired_consumption_pre_tax: np.ndarray
+    actual_consumption_post_tax: np.ndarray
+    consumption_post_tax_post_inflation: np.ndarray
+    annual_utility: np.ndarray
+
+
+def step_year(
+    *,
+    tax_free: np.ndarray,
+    taxable: np.ndarray,
+    taxable_basis: np.ndarray,
+    consumption_fraction: np.ndarray,
+    risky_asset_fraction: np.ndarray,
+    risky_returns: np.ndarray,
+    risk_free_rate: float,
+    tax_rate: float,
+    gamma: np.ndarray,
+    inflation_discount_factor: np.ndarray | float,
+    utility_discount: np.ndarray | float,
+    dtype: npt.DTypeLike = np.float64,
+) -> YearStep:
+    """Steps 3 to 6 of a simulated year for the paths still alive: grow the accounts
+    (after the year's income) with `risky_returns`, consume from them as the policy
+    says, and value the consumption. Shared by this engine and `findec.book`, which
+    look up policies and returns in their own ways."""
+    stage = stage_timer()
+
+    # 3) Grow assets
+    with stage("grow"):
+        growth = risky_asset_fraction * (1 + risky_returns) + (
+            1 - risky_asset_fraction
+        ) * (1 + risk_free_rate)
+        taxable = taxable * growth
+        tax_free = tax_free * growth
+
+    # 4) Use policy to decide how much to consume
+    desired_consumption_pre_tax = consumption_fraction * (tax_free + taxable)
+
+    # 5) Consume from assets
+    with stage("consume"):
+        actual_consumption_post_tax, tax_free, taxable, taxable_basis = (
+            withdraw_taxable_first(
+                fractional_consumption=consumption_fraction,
+                tax_free=tax_free,
+                taxable=taxable,
+                taxable_basis=taxable_basis,
+                tax_rate=tax_rate,
+            )
+        )
+    consumption_post_tax_post_inflation = (
+        actual_consumption_post_tax * inflation_discount_factor
+    )
+
+    # 6) Utility from consumption
+    with stage("utility"):
+        annual_utility = (
+            crra_utility(consumption_post_tax_post_inflation, gamma=gamma, dtype=dtype)
+            / utility_discount
+        )
+    return YearStep(
+        tax_free=tax_free,
+        taxable=taxable,
+        taxable_basis=taxable_basis,
+        desired_consumption_pre_tax=desired_consumption_pre_tax,
+        actual_consumption_post_tax=actual_consumption_post_tax,
+        consumption_post_tax_post_inflation=consumption_post_tax_post_inflation,
+        annual_utility=annual_utility,
+    )
+
+
+def simulate_life_paths_batch(
+    *,
+    n_paths: int,
+    expected_return_risky: float,
+    std_dev_return_risky: float,
+    risk_free_rate: float,
+    tax_rate: float,
+    pref: Preferences,
+    assets: Assets,
+    social_security: float,
+    time_horizon_max: int,
+    rng: np.random.Generator | None = None,
+    starting_age: int = 65,
+    is_male: bool = False,
+    with_longevity_uncertainty: bool = True,
+    returns_distribution_type: DistributionType = DistributionType.NORMAL,
+    policy_table: PolicyTable | None = None,
+    policy_rule: PolicyRule | None = None,
+    run_offset: int = 0,
+    scenarios: ScenarioBank | None = None,
+    dtype: npt.DTypeLike = np.float64,
+) -> StateBatch:
+    """Simulate `n_paths` life paths together. The closed-form Merton policy from
+    `policy_table` is followed unless another `policy_rule` is given.
+
+    Randomness comes from `rng`, or, if `scenarios` is given, from its pre-drawn return
+    shocks and death ages, which must have been drawn with the same `is_male` and
+    `with_longevity_uncertainty`.
+
+    Balances, returns, consumption and utilities are computed and stored in `dtype`;
+    float32 halves the memory traffic. `total_utility` and `total_consumption` are
+    always summed in float64: yearly CRRA utilities are all close to 1 / (gamma - 1),
+    and in float32 their sum would round away the differences between paths. The
+    shocks are the same for either dtype (see `RiskyAsset.draw`), so a float32 run can
+    be compared path by path with a float64 one; see `findec.precision`.
+    """
+    if scenarios is None and rng is None:
+        raise ValueError("Either rng or scenarios must be given")
+    if scenarios is not None and (
+        scenarios.n_paths != n_paths
+        or scenarios.starting_age != starting_age
+        or scenarios.time_horizon_max < time_horizon_max
+    ):
+        raise ValueError(
+            f"Scenario bank of {scenarios.n_paths} paths from age {scenarios.starting_age} "
+            f"over {scenarios.time_horizon_max} years does not cover {n_paths} paths from "
+            f"age {starting_age} over {time_horizon_max} years"
+        )
+    if scenarios is not None:
+        scenarios.check_mortality(
+            is_male=is_male, with_longevity_uncertainty=with_longevity_uncertainty
+        )
+    stage = stage_timer()
+    ra = RiskyAsset(
+        expected_return=expected_return_risky,
+        standard_deviation=std_dev_return_risky,
+        distribution_type=returns_distribution_type,
+    )
+    if policy_table is None:
+        with stage("policy_table"):
+            policy_table = build_policy_table(
+                pref=pref,
+                risk_free_rate=risk_free_rate,
+                risky_asset=ra,
+                inflation_rate=assets.inflation_rate,
+                starting_age=starting_age,
+                time_horizon_max=time_horizon_max,
+                with_longevity_uncertainty=with_longevity_uncertainty,
+                is_male=is_male,
+            )
+    if policy_rule is None:
+        policy_rule = policy_table
+
+    n_ages = time_horizon_max + 1
+    shape = (n_ages, n_paths)
+
+    # Lifetimes are known up front; paths are dropped from the working set when they die
+    with stage("mortality"):
+        if scenarios is not None:
+            # Read (possibly memory-mapped) scenarios into memory once
+            death_age = np.array(scenarios.death_age)
+            return_shocks = np.array(scenarios.return_shocks, dtype=dtype)
+        elif with_longevity_uncertainty:
+            death_age = mortality_table(is_male).sample_death_age(
+                starting_age=starting_age, n=n_paths, rng=rng
+            )
+        else:
+            death_age = np.full(n_paths, starting_age + n_ages)
+    died = death_age < starting_age + n_ages
+
+    def empty(dtype: npt.DTypeLike = dtype) -> np.ndarray:
+        return np.full(shape, np.nan, dtype=dtype)
+
+    out = StateBatch(
+        ages=np.arange(starting_age, starting_age + n_ages),
+        last_index=np.where(died, death_age - starting_age, time_horizon_max),
+        died=died,
+        tax_free=empty(),
+        taxable=empty(),
+        taxable_basis=empty(),
+        portfolio_value_post_inflation=empty(),
+        risky_return=empty(),
+        desired_consumption_pre_tax=empty(),
+        actual_consumption_post_tax=empty(),
+        consumption_post_tax_post_inflation=empty(),
+        consumption_fraction=empty(),
+        total_utility=empty(np.float64),
+        total_consumption=empty(np.float64),
+        annual_utility=empty(),
+        bequest_post_inflation=empty(),
+        run_offset=run_offset,
+    )
+
+    # Working set: state of the paths still alive, and their columns in `out`
+    path = np.arange(n_paths)
+    tax_free = np.full(n_paths, assets.tax_free, dtype=dtype)
+    taxable = np.full(n_paths, assets.taxable, dtype=dtype)
+    taxable_basis = np.full(n_paths, assets.taxable_basis, dtype=dtype)
+    total_utility = np.zeros(n_paths)
+    total_consumption = np.zeros(n_paths)
+    regime = np.zeros(n_paths, dtype=np.intp)
+
+    def record(t: int, columns: np.ndarray, **values: np.ndarray):
+        for name, value in values.items():
+            getattr(out, name)[t, columns] = value
+
+    record(
+        0,
+        path,
+        tax_free=tax_free,
+        taxable=taxable,
+        taxable_basis=taxable_basis,
+        portfolio_value_post_inflation=tax_free + taxable,
+        total_utility=total_utility,
+        total_consumption=total_consumption,
+    )
+
+    for t in range(1, n_ages):
+        age = starting_age + t
+        # As Python floats, so that they don't promote float32 arrays
+        discount = float(policy_table.utility_discount[t])
+        inflation_discount_factor = float(policy_table.inflation_discount_factor[t])
+
+        with stage("regime"):
+            wealth_post_inflation = (tax_free + taxable) * inflation_discount_factor
+            regime = policy_table.regime(wealth_post_inflation)
+
+        dies = death_age[path] == age
+        if dies.any():
+            with stage("utility"):
+                bu = bequest_utility(
+                    wealth_post_inflation[dies],
+                    b=pref.bequest_param,
+                    gamma=policy_table.gamma[regime[dies]],
+                    dtype=dtype,
+                ) / discount
+            with stage("record"):
+                record(
+                    t,
+                    path[dies],
+                    tax_free=tax_free[dies],
+                    taxable=taxable[dies],
+                    taxable_basis=taxable_basis[dies],
+                    portfolio_value_post_inflation=wealth_post_inflation[dies],
+                    total_utility=total_utility[dies] + bu,
+                    total_consumption=total_consumption[dies],
+                    annual_utility=bu,
+                    bequest_post_inflation=wealth_post_inflation[dies],
+                )
+            keep = ~dies
+            path = path[keep]
+            tax_free = tax_free[keep]
+            taxable = taxable[keep]
+            taxable_basis = taxable_basis[keep]
+            total_utility = total_utility[keep]
+            total_consumption = total_consumption[keep]
+            regime = regime[keep]
+            if path.size == 0:
+                break
+        gamma = policy_table.gamma[regime]
+
+        # 1) Income from social security
+        taxable = taxable + social_security
+        taxable_basis = taxable_basis + social_security
+
+        # 2) Look up policy for each path
+        with stage("policy"):
+            consumption_fraction, risky_asset_fraction = (
+                np.asarray(fraction, dtype=dtype)
+                for fraction in policy_rule.fractions(
+                    t, regime, (tax_free + taxable) * inflation_discount_factor
+                )
+            )
+
+        # 3) to 6) Grow assets with this year's returns, consume and value it
+        with stage("returns"):
+            if scenarios is None:
+                # One draw comes back as a Python float
+                draws = ra.draw(n_draws=path.size, rng=rng, dtype=dtype)
+                risky_returns = np.atleast_1d(np.asarray(draws, dtype=dtype))
+            else:
+                risky_returns = ra.from_standard_normal(return_shocks[path, t])
+        step = step_year(
+            tax_free=tax_free,
+            taxable=taxable,
+            taxable_basis=taxable_basis,
+            consumption_fraction=consumption_fraction,
+            risky_asset_fraction=risky_asset_fraction,
+            risky_returns=risky_returns,
+            risk_free_rate=risk_free_rate,
+            tax_rate=tax_rate,
+            gamma=gamma,
+            inflation_discount_factor=inflation_discount_factor,
+            utility_discount=discount,
+            dtype=dtype,
+        )
+        tax_free, taxable, taxable_basis = step.tax_free, step.taxable, step.taxable_basis
+        total_consumption = total_consumption + step.consumption_post_tax_post_inflation
+        total_utility = total_utility + step.annual_utility
+
+        with stage("record"):
+            record(
+                t,
+                path,
+                tax_free=tax_free,
+                taxable=taxable,
+                taxable_basis=taxable_basis,
+                portfolio_value_post_inflation=(tax_free + taxable) * inflation_discount_factor,
+                risky_return=risky_returns,
+                desired_consumption_pre_tax=step.desired_consumption_pre_tax,
+                actual_consumption_post_tax=step.actual_consumption_post_tax,
+                consumption_post_tax_post_inflation=(
+                    step.consumption_post_tax_post_inflation
+                ),
+                consumption_fraction=consumption_fraction,
+                total_utility=total_utility,
+                total_consumption=total_consumption,
+                annual_utility=step.annual_utility,
+            )
+
+    if path.size:
+        # final bequest
+        t = time_horizon_max
+        wealth_post_inflation = (tax_free + taxable) * float(
+            policy_table.inflation_discount_factor[t]
+        )
+        bu = bequest_utility(
+            wealth_post_inflation,
+            b=pref.bequest_param,
+            gamma=policy_table.gamma[regime],
+            dtype=dtype,
+        ) / float(policy_table.utility_discount[t])
+        out.total_utility[t, path] += bu
+        out.annual_utility[t, path] += bu
+        out.bequest_post_inflation[t, path] = wealth_post_inflation
+
+    return out
@@ -0,0 +1,454 @@
+"""Benchmarks of the simulation, policy, utility and DP hot paths.
+
+Run as a script to time every benchmark, write the results as JSON and compare them
+with a run of the suite at another git ref, on the same machine:
+
+    python -m findec.benchmark --output results.json --baseline-ref origin/main
+
+or with stored results (`--baseline benchmarks/baseline.json`), which are only
+comparable on the machine that recorded them.
+
+Each benchmark's wall time is the median of `repeat` runs. Peak memory is measured in
+one further run with `tracemalloc`, so it counts Python and numpy allocations but not
+those made inside polars. Throughput is in simulated path-years per second, for the
+benchmarks that simulate paths.
+"""
+
+import argparse
+import copy
+import functools
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from findec.assets import Assets, AssetsBatch
+from findec.consumption import consume_from_assets, consume_from_assets_batch
+from findec.dataclasses import Preferences
+from findec.dp import (
+    solve_consumption,
+    solve_consumption_egm,
+    solve_consumption_investment,
+    solve_sequence,
+)
+from findec.policy import policy
+from findec.reference import reference_kwargs
+from findec.returns import RiskyAsset
+from findec.simulate import simulate_life_path, simulate_life_paths
+from findec.utility import bequest_utility, composite_crra_utility, crra_utility
+
+# Wall time or peak memory this much above the baseline is flagged as a regression
+THRESHOLD_DEFAULT = 0.2
+
+
+@dataclass
+class Benchmark:
+    """`run` does the work once and returns the number of path-years it simulated, or
+    None if it doesn't simulate paths"""
+
+    name: str
+    run: Callable[[], int | None]
+    repeat: int = 3
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    wall_time: float  # seconds, median of `repeat`
+    peak_memory: int  # bytes
+    path_years: int | None = None
+
+    @property
+    def path_years_per_second(self) -> float | None:
+        if self.path_years is None:
+            return None
+        return self.path_years / self.wall_time
+
+
+def _simulate_one(n_calls: int) -> int:
+    path_years = 0
+    for i in range(n_calls):
+        states = simulate_life_path(rng_seed=i, rng_seed_offset=0, **reference_kwargs())
+        path_years += len(states.to_frame()) - 1
+    return path_years
+
+
+def _simulate_many(
+    *,
+    n_sims: int,
+    vectorized: bool,
+    with_longevity_uncertainty: bool,
+    dtype: type = np.float64,
+    frame: bool = False,
+) -> int:
+    """Simulate `n_sims` paths into a summary, or into a data frame with `frame`"""
+    result = simulate_life_paths(
+        n_sims=n_sims,
+        vectorized=vectorized,
+        summary=not frame,
+        dtype=dtype,
+        rng_seed_offset=0,
+        progress=False,
+        **reference_kwargs(with_longevity_uncertainty=with_longevity_uncertainty),
+    )
+    # Every path has one row before its first simulated year
+    if frame:
+        rows = len(result)
+    else:
+        rows = int(result.moments["total_utility"].count.sum())
+    return rows - n_sims
+
+
+def _policy(n_calls: int) -> None:
+    pref = Preferences()
+    ra = RiskyAsset(expected_return=0.09, standard_deviation=0.20)
+    for t in range(n_calls):
+        policy(
+            time_horizon=1 + t % 35,
+            gamma=pref.gamma_above_subsistence,
+            pref=pref,
+            risk_free_rate=0.04,
+            risky_asset=ra,
+            bequest_param=pref.bequest_param,
+        )
+
+
+def _consume_from_assets(n_calls: int) -> None:
+    start = Assets(tax_free=400_000.0, taxable=600_000.0, inflation_rate=0.02)
+    start.taxable_basis = 450_000.0
+    for i in range(n_calls):
+        assets = copy.copy(start)
+        consume_from_assets(
+            fractional_consumption=0.02 + 0.96 * (i % 100) / 100,
+            assets=assets,
+            tax_rate=0.2,
+        )
+
+
+def _consume_from_assets_batch(n_accounts: int) -> None:
+    assets = AssetsBatch(
+        tax_free=np.full(n_accounts, 400_000.0),
+        taxable=np.full(n_accounts, 600_000.0),
+        inflation_rate=0.02,
+        taxable_basis=np.full(n_accounts, 450_000.0),
+    )
+    consume_from_assets_batch(
+        fractional_consumption=0.02 + 0.96 * (np.arange(n_accounts) % 100) / 100,
+        assets=assets,
+        tax_rate=0.2,
+    )
+
+
+def _utility_kernels(n: int) -> None:
+    pref = Preferences()
+    w = np.random.default_rng(0).lognormal(mean=10, sigma=1, size=n)
+    crra_utility(w, gamma=pref.gamma_above_subsistence)
+    composite_crra_utility(w, pref=pref)
+    bequest_utility(w, b=pref.bequest_param, gamma=pref.gamma_above_subsistence)
+
+
+def _solve(solver: Callable, **kwargs) -> None:
+    solver(**kwargs)
+
+
+def _solve_gamma_sweep(*, warm_start: bool, n_grid: int) -> None:
+    solve_sequence(
+        solve_consumption_investment,
+        [{"gamma": gamma} for gamma in np.linspace(1.5, 4.0, 11)],
+        warm_start=warm_start,
+        n_grid=n_grid,
+        risky_asset=RiskyAsset(expected_return=0.09, standard_deviation=0.20),
+    )
+
+
+def suite(quick: bool = False) -> list[Benchmark]:
+    """Every benchmark. `quick` shrinks the path counts and grids, for a smoke run."""
+    scale = 10 if quick else 1
+    benchmarks = [
+        Benchmark("simulate_life_path", lambda: _simulate_one(100 // scale)),
+        Benchmark("policy", lambda: _policy(10_000 // scale)),
+        Benchmark("consume_from_assets", lambda: _consume_from_assets(10_000 // scale)),
+        Benchmark(
+            "consume_from_assets_batch",
+            lambda: _consume_from_assets_batch(1_000_000 // scale),
+        ),
+        Benchmark("utility_kernels", lambda: _utility_kernels(1_000_000 // scale)),
+    ]
+    for longevity in (True, False):
+        suffix = "" if longevity else "_fixed_lifetime"
+        for engine in ("scalar", "vectorized"):
+            for n_sims, label in ((1_000, "1k"), (10_000, "10k"), (100_000, "100k")):
+                # Data frames are only worth timing once building them adds up
+                for frame in (False, True) if n_sims > 1_000 else (False,):
+                    benchmarks.append(
+                        Benchmark(
+                            f"simulate_life_paths_{engine}_{label}{suffix}"
+                            + ("_frame" if frame else ""),
+                            functools.partial(
+                                _simulate_many,
+                                n_sims=n_sims // scale,
+                                vectorized=engine == "vectorized",
+                                with_longevity_uncertainty=longevity,
+                                frame=frame,
+                            ),
+                            repeat=(
+                                3 if engine == "vectorized" and n_sims < 100_000 else 1
+                            ),
+                        )
+                    )
+        benchmarks.append(
+            Benchmark(
+                f"simulate_life_paths_vectorized_100k{suffix}_float32",
+                lambda longevity=longevity: _simulate_many(
+                    n_sims=100_000 // scale,
+                    vectorized=True,
+                    with_longevity_uncertainty=longevity,
+                    dtype=np.float32,
+                ),
+                repeat=1,
+            )
+        )
+    dp_kwargs = dict(W0=1_000_000.0, r_ra=0.03, r_tp=0.02, gamma=2.0, T=35)
+    for n_grid in (200, 500, 1_000):
+        benchmarks.append(
+            Benchmark(
+                f"solve_consumption_{n_grid}",
+                lambda n_grid=n_grid: _solve(
+                    solve_consumption,
+                    **dp_kwargs,
+                    n_grid=n_grid // scale,
+                    c_grid_size=101,
+                ),
+            )
+        )
+        benchmarks.append(
+            Benchmark(
+                f"solve_consumption_egm_{n_grid}",
+                lambda n_grid=n_grid: _solve(
+                    solve_consumption_egm, **dp_kwargs, n_grid=n_grid // scale
+                ),
+            )
+        )
+    for n_grid in (50, 100, 200):
+        benchmarks.append(
+            Benchmark(
+                f"solve_consumption_investment_{n_grid}",
+                lambda n_grid=n_grid: _solve(
+                    solve_consumption_investment, n_grid=n_grid // scale
+                ),
+            )
+        )
+    for warm_start in (False, True):
+        benchmarks.append(
+            Benchmark(
+                "solve_consumption_investment_gamma_sweep"
+                + ("_warm" if warm_start else ""),
+                lambda warm_start=warm_start: _solve_gamma_sweep(
+                    warm_start=warm_start, n_grid=100 // scale
+                ),
+                repeat=1,
+            )
+        )
+    return benchmarks
+
+
+def run_benchmark(benchmark: Benchmark) -> BenchmarkResult:
+    wall_times = []
+    for _ in range(benchmark.repeat):
+        gc.collect()
+        start = time.perf_counter()
+        path_years = benchmark.run()
+        wall_times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        benchmark.run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        name=benchmark.name,
+        wall_time=statistics.median(wall_times),
+        peak_memory=peak_memory,
+        path_years=path_years,
+    )
+
+
+def _environment() -> dict:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def to_json(results: list[BenchmarkResult], *, quick: bool) -> dict:
+    return {
+        "environment": _environment(),
+        "quick": quick,
+        "results": {
+            r.name: {
+                **{k: v for k, v in asdict(r).items() if k != "name"},
+                "path_years_per_second": r.path_years_per_second,
+            }
+            for r in results
+        },
+    }
+
+
+def compare(
+    results: dict, baseline: dict, *, threshold: float = THRESHOLD_DEFAULT
+) -> list[str]:
+    """Regressions of `results` against `baseline` (both as written by `to_json`): wall
+    time or peak memory more than `threshold` above the baseline's"""
+    if results.get("quick") != baseline.get("quick"):
+        raise ValueError("Quick and full benchmark runs can't be compared")
+    regressions = []
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue  # see `missing_baselines`
+        for metric in ("wall_time", "peak_memory"):
+            new, old = result[metric], baseline["results"][name][metric]
+            if old > 0 and new > old * (1 + threshold):
+                regressions.append(
+                    f"{name}: {metric} {new:.4g} vs baseline {old:.4g} "
+                    f"(+{new / old - 1:.0%})"
+                )
+    return regressions
+
+
+def missing_baselines(results: dict, baseline: dict) -> list[str]:
+    """Benchmarks in `results` that `baseline` has no entry for, so `compare` can't
+    check them"""
+    return [name for name in results["results"] if name not in baseline["results"]]
+
+
+def run_at_ref(ref: str, *, quick: bool, pattern: str | None = None) -> dict:
+    """The results of the benchmark suite of git `ref`, run on this machine in a
+    temporary worktree, as written by `to_json`"""
+    src = Path(__file__).resolve().parents[1]
+    top = Path(
+        subprocess.run(
+            ["git", "rev-parse", "--show-toplevel"],
+            cwd=src,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        worktree = Path(tmp) / "worktree"
+        output = Path(tmp) / "results.json"
+        subprocess.run(
+            ["git", "worktree", "add", "--detach", "--quiet", str(worktree), ref],
+            cwd=top,
+            check=True,
+        )
+        try:
+            worktree_src = worktree / src.relative_to(top)
+            command = [sys.executable, "-m", "findec.benchmark", "--output", str(output)]
+            if quick:
+                command.append("--quick")
+            if pattern:
+                command.extend(["-k", pattern])
+            subprocess.run(
+                command,
+                cwd=worktree_src,
+                env={**os.environ, "PYTHONPATH": str(worktree_src)},
+                check=True,
+            )
+            return json.loads(output.read_text())
+        finally:
+            subprocess.run(
+                ["git", "worktree", "remove", "--force", str(worktree)],
+                cwd=top,
+                check=True,
+            )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, help="Write the results here as JSON")
+    baseline = parser.add_mutually_exclusive_group()
+    baseline.add_argument("--baseline", type=Path, help="Compare with these results")
+    baseline.add_argument(
+        "--baseline-ref",
+        help="Compare with the suite of this git ref (e.g. the merge base), run first "
+        "on this machine",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write the results to --baseline instead of comparing with it",
+    )
+    parser.add_argument("--threshold", type=float, default=THRESHOLD_DEFAULT)
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Fail if a benchmark has no entry in the baseline",
+    )
+    parser.add_argument("--quick", action="store_true", help="Smaller problem sizes")
+    parser.add_argument(
+        "-k", dest="pattern", help="Only run benchmarks with this in their name"
+    )
+    args = parser.parse_args(argv)
+    if args.save_baseline and args.baseline is None:
+        parser.error("--save-baseline needs --baseline")
+
+    if args.baseline_ref is not None:
+        print(f"Baseline: {args.baseline_ref}", flush=True)
+        baseline = run_at_ref(args.baseline_ref, quick=args.quick, pattern=args.pattern)
+        print("This tree:", flush=True)
+    elif args.baseline is not None and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())
+    else:
+        baseline = None
+
+    results = []
+    for benchmark in suite(quick=args.quick):
+        if args.pattern and args.pattern not in benchmark.name:
+            continue
+        result = run_benchmark(benchmark)
+        throughput = result.path_years_per_second
+        print(
+            f"{result.name:56s} {result.wall_time:9.4f} s "
+            f"{result.peak_memory / 2**20:9.1f} MiB"
+            + (f" {throughput:12,.0f} path-years/s" if throughput else ""),
+            flush=True,
+        )
+        results.append(result)
+    report = to_json(results, quick=args.quick)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+    if baseline is None:
+        return 0
+    regressions = compare(report, baseline, threshold=args.threshold)
+    missing = missing_baselines(report, baseline)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    for name in missing:
+        print(f"NO BASELINE {name}", file=sys.stderr)
+    return 1 if regressions or (args.strict and missing) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+"""Simulation of a whole book of clients in one vectorized pass.
+
+Every client has their own accounts, `Preferences`, starting age, sex and social
+security; they share the market and the tax rate. Each client's paths are moved forward
+together with every other client's, with per-path arrays of the client's parameters
+(policy, subsistence, discounting, bequest motive, income) driving the same sequence of
+events as `findec.batch.simulate_life_paths_batch`, through the same
+`findec.batch.step_year`.
+
+All clients see the same `n_paths` market scenarios, as clients of one book do, so path
+j of every client has the same risky returns. Lifetimes are drawn independently for
+every client and path.
+
+Only lifetime totals are kept per path, not per-age panels, so a book of thousands of
+clients fits in memory.
+"""
+
+from dataclasses import dataclass, fields
+
+import numpy as np
+import polars as pl
+
+from findec.batch import step_year
+from findec.dataclasses import Preferences
+from findec.policy import build_policy_table
+from findec.returns import DistributionType, RiskyAsset
+from findec.survival import mortality_table
+from findec.utility import bequest_utility, certainty_equivalent_return, crra_utility
+
+PREFERENCE_FIELDS = [f.name for f in fields(Preferences)]
+CLIENT_COLUMNS_REQUIRED = ["client_id", "tax_free", "taxable", "social_security"]
+CLIENT_COLUMNS_DEFAULT = {
+    "taxable_basis": None,  # the taxable balance: no unrealized gains
+    "inflation_rate": 0.02,
+    "starting_age": 65,
+    "is_male": False,
+    **{f.name: f.default for f in fields(Preferences)},
+}
+
+
+@dataclass
+class BookPaths:
+    """Lifetime totals of every simulated path; path p belongs to client `client[p]`
+    (a row of the client table) and market scenario `scenario[p]`"""
+
+    client: np.ndarray
+    scenario: np.ndarray
+    death_age: np.ndarray  # past the horizon for paths that outlive it
+    outlived_horizon: np.ndarray
+    total_utility: np.ndarray
+    total_consumption: np.ndarray  # post-tax, post-inflation
+    bequest_post_inflation: np.ndarray
+    # For the consumption certainty equivalent, at gamma_above_subsistence
+    consumption_utility: np.ndarray
+    discounted_years: np.ndarray
+
+
+def client_table(clients: pl.DataFrame | list[dict] | dict) -> pl.DataFrame:
+    """`clients` with every column of `CLIENT_COLUMNS_DEFAULT` filled in, including
+    missing values. Raises
+    ValueError for missing required or unknown columns."""
+    clients = pl.DataFrame(clients)
+    if missing := [c for c in CLIENT_COLUMNS_REQUIRED if c not in clients.columns]:
+        raise ValueError(f"Client table is missing columns {missing}")
+    known = set(CLIENT_COLUMNS_REQUIRED) | set(CLIENT_COLUMNS_DEFAULT)
+    if unknown := [c for c in clients.columns if c not in known]:
+        raise ValueError(f"Unknown client columns {unknown}")
+    if clients["client_id"].is_duplicated().any():
+        raise ValueError("client_id must be unique")
+    for name, default in CLIENT_COLUMNS_DEFAULT.items():
+        value = pl.col("taxable") if default is None else pl.lit(default)
+        if name in clients.columns:
+            # e.g. from a list of dicts that don't all set it
+            value = pl.col(name).fill_null(value)
+        clients = clients.with_columns(value.alias(name))
+    return clients
+
+
+def _client_parameters(
+    clients: pl.DataFrame,
+    *,
+    risk_free_rate: float,
+    risky_asset: RiskyAsset,
+    time_horizon_max: int,
+    with_longevity_uncertainty: bool,
+) -> dict[str, np.ndarray]:
+    """Per-client arrays of everything the year loop needs, with the Merton policy
+    tables stacked along the first axis"""
+    tables = {}
+    rows = []
+    for client in clients.iter_rows(named=True):
+        pref = Preferences(**{f: client[f] for f in PREFERENCE_FIELDS})
+        key = (
+            tuple(client[f] for f in PREFERENCE_FIELDS),
+            client["inflation_rate"],
+            client["starting_age"],
+            client["is_male"],
+        )
+        if key not in tables:
+            tables[key] = build_policy_table(
+                pref=pref,
+                risk_free_rate=risk_free_rate,
+                risky_asset=risky_asset,
+                inflation_rate=client["inflation_rate"],
+                starting_age=client["starting_age"],
+                time_horizon_max=time_horizon_max,
+                with_longevity_uncertainty=with_longevity_uncertainty,
+                is_male=client["is_male"],
+            )
+        rows.append(tables[key])
+    return {
+        "subsistence": np.array([t.subsistence for t in rows]),
+        "gamma": np.stack([t.gamma for t in rows]),
+        "consumption_fraction": np.stack([t.consumption_fraction for t in rows]),
+        "risky_asset_fraction": np.stack([t.risky_asset_fraction for t in rows]),
+        "inflation_discount_factor": np.stack(
+            [t.inflation_discount_factor for t in rows]
+        ),
+        "utility_discount": np.stack([t.utility_discount for t in rows]),
+    }
+
+
+def _death_ages(
+    clients: pl.DataFrame,
+    *,
+    n_paths: int,
+    time_horizon_max: int,
+    with_longevity_uncertainty: bool,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """(n_clients, n_paths) ages at death"""
+    starting_age = clients["starting_age"].to_numpy()
+    if not with_longevity_uncertainty:
+        return np.repeat(starting_age[:, None] + time_horizon_max + 1, n_paths, axis=1)
+    u = rng.random((len(clients), n_paths))
+    death_age = np.empty(u.shape, dtype=np.int64)
+    groups = clients.with_row_index("row").group_by("starting_age", "is_male")
+    for (age, is_male), group in groups:
+        rows = group["row"].to_numpy()
+        death_age[rows] = mortality_table(is_male).death_age_from_uniform(
+            starting_age=age, u=u[rows].ravel()
+        ).reshape(len(rows), n_paths)
+    return death_age
+
+
+def _simulate_clients(
+    clients: pl.DataFrame,
+    *,
+    return_shocks: np.ndarray,
+    death_age: np.ndarray,
+    risky_asset: RiskyAsset,
+    risk_free_rate: float,
+    tax_rate: float,
+    time_horizon_max: int,
+    with_longevity_uncertainty: bool,
+) -> BookPaths:
+    n_clients = len(clients)
+    n_paths = return_shocks.shape[0]
+    params = _client_parameters(
+        clients,
+        risk_free_rate=risk_free_rate,
+        risky_asset=risky_asset,
+        time_horizon_max=time_horizon_max,
+        with_longevity_uncertainty=with_longevity_uncertainty,
+    )
+
+    def per_path(column: str) -> np.ndarray:
+        return np.repeat(clients[column].cast(pl.Float64).to_numpy(), n_paths)
+
+    client = np.repeat(np.arange(n_clients), n_paths)
+    scenario = np.tile(np.arange(n_paths), n_clients)
+    death_age = death_age.ravel()
+    years_to_death = death_age - np.repeat(clients["starting_age"].to_numpy(), n_paths)
+    bequest_param = per_path("bequest_param")
+    social_security = per_path("social_security")
+    gamma_above = per_path("gamma_above_subsistence")
+    consumption_discount = 1 + per_path("rate_time_preference")
+
+    n = len(client)
+    out = BookPaths(
+        client=client,
+        scenario=scenario,
+        death_age=death_age,
+        outlived_horizon=years_to_death > time_horizon_max,
+        total_utility=np.zeros(n),
+        total_consumption=np.zeros(n),
+        bequest_post_inflation=np.zeros(n),
+        consumption_utility=np.zeros(n),
+        discounted_years=np.zeros(n),
+    )
+
+    # Working set of paths still alive
+    path = np.arange(n)
+    tax_free = per_path("tax_free")
+    taxable = per_path("taxable")
+    taxable_basis = per_path("taxable_basis")
+    total_utility = np.zeros(n)
+    total_consumption = np.zeros(n)
+    regime = np.zeros(n, dtype=np.intp)
+
+    def bequest(t: int, dies: np.ndarray, wealth_post_inflation: np.ndarray):
+        c = client[path[dies]]
+        bu = bequest_utility(
+            wealth_post_inflation[dies],
+            b=bequest_param[path[dies]],
+            gamma=params["gamma"][c, regime[dies]],
+        ) / params["utility_discount"][c, t]
+        out.total_utility[path[dies]] = total_utility[dies] + bu
+        out.total_consumption[path[dies]] = total_consumption[dies]
+        out.bequest_post_inflation[path[dies]] = wealth_post_inflation[dies]
+
+    for t in range(1, time_horizon_max + 1):
+        c = client[path]
+        inflation_discount_factor = params["inflation_discount_factor"][c, t]
+        wealth_post_inflation = (tax_free + taxable) * inflation_discount_factor
+        regime = (wealth_post_inflation < params["subsistence"][c]).astype(np.intp)
+
+        dies = years_to_death[path] == t
+        if dies.any():
+            bequest(t, dies, wealth_post_inflation)
+            keep = ~dies
+            path, c = path[keep], c[keep]
+            tax_free, taxable, taxable_basis = (
+                tax_free[keep],
+                taxable[keep],
+                taxable_basis[keep],
+            )
+            total_utility, total_consumption = total_utility[keep], total_consumption[keep]
+            regime, inflation_discount_factor = (
+                regime[keep],
+                inflation_discount_factor[keep],
+            )
+            if path.size == 0:
+                break
+
+        # 1) Income from social security
+        taxable = taxable + social_security[path]
+        taxable_basis = taxable_basis + social_security[path]
+
+        # 2) Look up each client's policy
+        consumption_fraction = params["consumption_fraction"][c, t, regime]
+        risky_asset_fraction = params["risky_asset_fraction"][c, t, regime]
+
+        # 3) to 6) Grow assets with the returns of each path's market scenario, as in
+        # the batch engine
+        step = step_year(
+            tax_free=tax_free,
+            taxable=taxable,
+            taxable_basis=taxable_basis,
+            consumption_fraction=consumption_fraction,
+            risky_asset_fraction=risky_asset_fraction,
+            risky_returns=risky_asset.from_standard_normal(
+                return_shocks[scenario[path], t]
+            ),
+            risk_free_rate=risk_free_rate,
+            tax_rate=tax_rate,
+            gamma=params["gamma"][c, regime],
+            inflation_discount_factor=inflation_discount_factor,
+            utility_discount=params["utility_discount"][c, t],
+        )
+        tax_free, taxable, taxable_basis = step.tax_free, step.taxable, step.taxable_basis
+        consumption = step.consumption_post_tax_post_inflation
+        total_consumption = total_consumption + consumption
+        total_utility = total_utility + step.annual_utility
+
+        # For the consumption certainty equivalent
+        discount = consumption_discount[path] ** -t
+        out.consumption_utility[path] += (
+            crra_utility(consumption, gamma=gamma_above[path]) * discount
+        )
+        out.discounted_years[path] += discount
+
+    if path.size:
+        # final bequest
+        t = time_horizon_max
+        wealth_post_inflation = (tax_free + taxable) * params[
+            "inflation_discount_factor"
+        ][client[path], t]
+        bequest(t, np.ones(path.size, dtype=bool), wealth_post_inflation)
+    return out
+
+
+def simulate_book_paths(
+    clients: pl.DataFrame | list[dict] | dict,
+    *,
+    n_paths: int,
+    expected_return_risky: float,
+    std_dev_return_risky: float,
+    risk_free_rate: float,
+    tax_rate: float,
+    time_horizon_max: int,
+    rng_seed: int | None = 0,
+    with_longevity_uncertainty: bool = True,
+    returns_distribution_type: DistributionType = DistributionType.NORMAL,
+    batch_size: int = 1_000_000,
+) -> pl.DataFrame:
+    """Simulate `n_paths` life paths for every client in `clients` (see
+    `client_table` for its columns) and return one row per client and path, with the
+    path's lifetime totals.
+
+    Clients are simulated together, at most `batch_size` paths at a time. Results don't
+    depend on `batch_size`.
+    """
+    clients = client_table(clients)
+    rng = np.random.default_rng(rng_seed)
+    risky_asset = RiskyAsset(
+        expected_return=expected_return_risky,
+        standard_deviation=std_dev_return_risky,
+        distribution_type=returns_distribution_type,
+    )
+    return_shocks = rng.standard_normal((n_paths, time_horizon_max + 1))
+    death_age = _death_ages(
+        clients,
+        n_paths=n_paths,
+        time_horizon_max=time_horizon_max,
+        with_longevity_uncertainty=with_longevity_uncertainty,
+        rng=rng,
+    )
+
+    clients_per_batch = max(1, batch_size // n_paths)
+    frames = []
+    for start in range(0, len(clients), clients_per_batch):
+        rows = slice(start, start + clients_per_batch)
+        chunk = clients[rows]
+        paths = _simulate_clients(
+            chunk,
+            return_shocks=return_shocks,
+            death_age=death_age[rows],
+            risky_asset=risky_asset,
+            risk_free_rate=risk_free_rate,
+            tax_rate=tax_rate,
+            time_horizon_max=time_horizon_max,
+            with_longevity_uncertainty=with_longevity_uncertainty,
+        )
+        frames.append(
+            pl.DataFrame(
+                {
+                    "client_id": chunk["client_id"].gather(paths.client),
+                    "path": paths.scenario,
+                    **{
+                        f.name: getattr(paths, f.name)
+                        for f in fields(BookPaths)
+                        if f.name not in ("client", "scenario")
+                    },
+                }
+            )
+        )
+    return pl.concat(frames)
+
+
+def simulate_book(
+    clients: pl.DataFrame | list[dict] | dict,
+    *,
+    n_paths: int,
+    quantiles: list[float] | tuple[float, ...] = (0.05, 0.5, 0.95),
+    **kwargs,
+) -> pl.DataFrame:
+    """Simulate every client as in `simulate_book_paths` and summarise each client in
+    one row, keyed by client_id: expected lifetime utility with its standard error,
+    the consumption certainty equivalent (as in
+    `findec.summary.LifetimeUtilityEstimator`), mean total consumption and bequest, the
+    probability of outliving the horizon, and quantiles of lifetime utility."""
+    paths = simulate_book_paths(clients, n_paths=n_paths, **kwargs)
+    summary = paths.group_by("client_id", maintain_order=True).agg(
+        pl.len().alias("n_paths"),
+        pl.col("total_utility").mean().alias("expected_utility"),
+        (pl.col("total_utility").std() / pl.len().sqrt()).alias(
+            "expected_utility_standard_error"
+        ),
+        pl.col("consumption_utility").mean(),
+        pl.col("discounted_years").mean(),
+        pl.col("total_consumption").mean().alias("total_consumption_mean"),
+        pl.col("bequest_post_inflation").mean().alias("bequest_mean"),
+        pl.col("outlived_horizon").mean().alias("probability_outlived_horizon"),
+        *[
+            pl.col("total_utility")
+            .quantile(q, interpolation="nearest")
+            .alias(f"total_utility_q_{q:.2f}")
+            for q in quantiles
+        ],
+    )
+    gamma = (
+        summary.select("client_id")
+        .join(client_table(clients), on="client_id", how="left")
+        .get_column("gamma_above_subsistence")
+        .to_numpy()
+    )
+    # Utility of the constant consumption level, per discounted year. The certainty
+    # equivalent "return" on wealth 1 is the certainty equivalent wealth - 1
+    utility_per_year = (
+        summary["consumption_utility"].to_numpy() / summary["discounted_years"].to_numpy()
+    )
+    certainty_equivalent = 1.0 + certainty_equivalent_return(
+        initial_wealth=1.0, expected_utility=utility_per_year, gamma=gamma
+    )
+    return summary.drop("consumption_utility", "discounted_years").insert_column(
+        4, pl.Series("certainty_equivalent_consumption", certainty_equivalent)
+    )
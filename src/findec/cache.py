@@ -0,0 +1,203 @@
+"""On-disk cache of simulation and DP results, keyed by their inputs.
+
+    cache = ResultCache()
+    sims = cache.simulate_life_paths(n_sims=100_000, rng_seed_offset=42, **kwargs)
+    C, V, W_grid, c_init = cache.call(solve_consumption, W0=1e6, ...)
+
+The key is a hash of the function, every keyword argument (dataclasses such as `Assets`
+and `Preferences` by their attributes, enums such as `DistributionType` by name, numpy
+arrays by their bytes, memory-mapped `ScenarioBank`s by their directory and its files' sizes
+and modification times) and the installed version of findec. Frames are stored as Arrow
+IPC files, anything else (summaries, DP grids) as pickles. Each hit touches its file, and
+once the directory holds more than `max_bytes` the least recently used entries are
+deleted.
+"""
+
+import dataclasses
+import enum
+import hashlib
+import importlib.metadata
+import os
+import pickle
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import polars as pl
+
+from findec.scenarios import DEATH_AGE_FILE, METADATA_FILE, RETURN_SHOCKS_FILE
+from findec.scenarios import ScenarioBank
+
+MAX_BYTES_DEFAULT = 2**30
+SUFFIXES = (".arrow", ".pickle")
+
+
+def default_directory() -> Path:
+    """$FINDEC_CACHE_DIR, or ~/.cache/findec"""
+    return Path(os.environ.get("FINDEC_CACHE_DIR", Path.home() / ".cache" / "findec"))
+
+
+def _version() -> str:
+    try:
+        return importlib.metadata.version("findec")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _hash_value(h: "hashlib._Hash", value: Any):
+    """Feed a canonical encoding of `value` to `h`"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        h.update(f"{type(value).__name__}:{value!r};".encode())
+    elif isinstance(value, enum.Enum):
+        h.update(f"{type(value).__qualname__}.{value.name};".encode())
+    elif isinstance(value, Path):
+        h.update(f"Path:{value};".encode())
+    elif isinstance(value, np.generic):
+        _hash_value(h, value.item())
+    elif isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        h.update(f"ndarray:{value.dtype.str}:{value.shape};".encode())
+        h.update(value.tobytes())
+    elif isinstance(value, np.dtype) or (
+        isinstance(value, type) and issubclass(value, (np.generic, float, int))
+    ):
+        h.update(f"dtype:{np.dtype(value).str};".encode())
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}[{len(value)}];".encode())
+        for item in value:
+            _hash_value(h, item)
+    elif isinstance(value, dict):
+        h.update(f"dict[{len(value)}];".encode())
+        for k in sorted(value):
+            _hash_value(h, k)
+            _hash_value(h, value[k])
+    elif isinstance(value, ScenarioBank) and value.path is not None:
+        # Hashing the arrays would read the whole bank on every lookup
+        h.update(f"ScenarioBank:{value.path.resolve()};".encode())
+        for name in (METADATA_FILE, RETURN_SHOCKS_FILE, DEATH_AGE_FILE):
+            stat = (value.path / name).stat()
+            h.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        _hash_value(h, (value.n_paths, value.time_horizon_max))
+    elif dataclasses.is_dataclass(value):
+        # vars, not fields: Assets sets taxable_basis outside its fields
+        h.update(f"{type(value).__module__}.{type(value).__qualname__};".encode())
+        _hash_value(h, vars(value))
+    else:
+        raise TypeError(f"Can't hash a {type(value).__name__} for the result cache")
+
+
+class ResultCache:
+    """Results of keyword-only calls, stored in `directory` (by default
+    `default_directory()`) and kept within `max_bytes` by evicting the least recently
+    used. `hits` and `misses` count lookups."""
+
+    def __init__(
+        self, directory: str | Path | None = None, *, max_bytes: int = MAX_BYTES_DEFAULT
+    ):
+        self.directory = Path(directory) if directory is not None else default_directory()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+
+    def key(self, function: Callable, kwargs: dict) -> str:
+        h = hashlib.sha256()
+        _hash_value(h, [f"{function.__module__}.{function.__qualname__}", _version()])
+        _hash_value(h, kwargs)
+        return h.hexdigest()
+
+    def call(self, function: Callable, /, **kwargs) -> Any:
+        """`function(**kwargs)`, from the cache if it has been computed before"""
+        return self._get_or_compute(self.key(function, kwargs), lambda: function(**kwargs))
+
+    def simulate_life_paths(self, **kwargs) -> Any:
+        """`findec.simulate.simulate_life_paths(**kwargs)` through the cache. The paths
+        must be reproducible: `rng_seed_offset` or `scenarios` must be given. Neither the
+        number of `workers` nor `progress` changes the result, so they aren't part of the
+        key, but whether the scalar engine runs serially (`workers=None`, seeded per path
+        number) or in workers (one random stream per path) does. A `sink` can't be
+        cached."""
+        from findec.simulate import simulate_life_paths
+
+        if kwargs.get("sink") is not None:
+            raise ValueError("Results written to a sink can't be cached")
+        if kwargs.get("rng_seed_offset") is None and kwargs.get("scenarios") is None:
+            raise ValueError(
+                "Without rng_seed_offset (or scenarios) every run draws new paths, so "
+                "there is nothing to cache"
+            )
+        if isinstance(kwargs.get("scenarios"), (str, Path)):
+            kwargs["scenarios"] = ScenarioBank.open(kwargs["scenarios"])
+        key_kwargs = {
+            k: v for k, v in kwargs.items() if k not in ("workers", "progress")
+        }
+        if not kwargs.get("vectorized", False):
+            key_kwargs["serial"] = kwargs.get("workers") is None
+        key = self.key(simulate_life_paths, key_kwargs)
+        return self._get_or_compute(key, lambda: simulate_life_paths(**kwargs))
+
+    def _get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        for suffix in SUFFIXES:
+            path = self.directory / f"{key}{suffix}"
+            try:
+                result = self._read(path)
+            except FileNotFoundError:
+                continue
+            self.hits += 1
+            path.touch()
+            return result
+        self.misses += 1
+        result = compute()
+        self._write(key, result)
+        self.evict()
+        return result
+
+    @staticmethod
+    def _read(path: Path) -> Any:
+        if path.suffix == ".arrow":
+            return pl.read_ipc(path)
+        with path.open("rb") as f:
+            return pickle.load(f)
+
+    def _write(self, key: str, result: Any):
+        suffix = ".arrow" if isinstance(result, pl.DataFrame) else ".pickle"
+        path = self.directory / f"{key}{suffix}"
+        # Write aside and rename, so readers never see a partial file
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        if suffix == ".arrow":
+            result.write_ipc(tmp)
+        else:
+            with tmp.open("wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        """(last use, size, path) of every entry"""
+        entries = []
+        for path in self.directory.iterdir():
+            if path.suffix not in SUFFIXES:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # evicted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Delete the least recently used entries until at most `max_bytes` remain"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            path.unlink(missing_ok=True)
@@ -0,0 +1,148 @@
+"""`findec` command: run a simulation or DP job described by a config file.
+
+    findec simulate job.toml --output paths.parquet
+    findec solve job.json --output solution.npz
+
+Configs are TOML (with `tomllib`, or `tomli` before Python 3.11) or JSON, with tables
+
+    [market]       expected_return_risky, std_dev_return_risky, risk_free_rate and
+                   optionally returns_distribution_type ("NORMAL" or "LOG_NORMAL")
+    [assets]       fields of `findec.assets.Assets`
+    [preferences]  fields of `findec.dataclasses.Preferences`
+    [simulation]   the other arguments of `findec.simulate.simulate_life_paths`, with
+                   sampling given by name ("SOBOL", ...)
+    [dp]           `solver` ("consumption", "consumption_egm" or
+                   "consumption_investment") and the arguments of the matching
+                   `findec.dp.solve_*` function
+
+Simulations write their paths to a `.parquet` or `.arrow` output as they go, or, with
+`summary = true`, a JSON file of expected utility, the certainty equivalent and
+per-age quantiles (moments only, for utilities). Solves write the solver's arrays to an `.npz` file.
+
+The heavy modules are only imported once the job is known, so `findec --help` and
+config errors come back quickly.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+SOLVERS = {
+    "consumption": ("C", "V", "W_grid", "optimal_c_init"),
+    "consumption_egm": ("C", "V", "W_grid", "optimal_c_init"),
+    "consumption_investment": ("V", "C_opt", "K_opt", "W_grid", "initial_policy"),
+}
+SUMMARY_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def load_config(path: str | Path) -> dict:
+    path = Path(path)
+    if path.suffix == ".json":
+        return json.loads(path.read_text())
+    if path.suffix != ".toml":
+        raise ValueError(f"Config must be .toml or .json, not {path.name}")
+    if sys.version_info >= (3, 11):
+        import tomllib
+    else:
+        import tomli as tomllib
+    with path.open("rb") as f:
+        return tomllib.load(f)
+
+
+def simulation_kwargs(config: dict) -> dict:
+    """`simulate_life_paths` arguments from a config's market, assets, preferences and
+    simulation tables"""
+    from findec.assets import Assets
+    from findec.dataclasses import Preferences
+    from findec.returns import DistributionType, SamplingMethod
+
+    kwargs = {**config.get("market", {}), **config.get("simulation", {})}
+    kwargs["assets"] = Assets(**config["assets"])
+    kwargs["pref"] = Preferences(**config.get("preferences", {}))
+    if "returns_distribution_type" in kwargs:
+        kwargs["returns_distribution_type"] = DistributionType[
+            kwargs["returns_distribution_type"]
+        ]
+    if "sampling" in kwargs:
+        kwargs["sampling"] = SamplingMethod[kwargs["sampling"]]
+    return kwargs
+
+
+def run_simulation(config: dict, output: Path) -> None:
+    from findec.simulate import simulate_life_paths
+
+    kwargs = simulation_kwargs(config)
+    if not kwargs.get("summary", False):
+        simulate_life_paths(sink=output, **kwargs)
+        return
+
+    summary = simulate_life_paths(**kwargs)
+    expected_utility, standard_error = summary.expected_utility()
+    cv_expected_utility, cv_standard_error = summary.expected_utility(
+        control_variates=True
+    )
+    certainty_equivalent, certainty_equivalent_error = summary.certainty_equivalent()
+    result = {
+        "n_paths": summary.n_paths,
+        "expected_utility": expected_utility,
+        "expected_utility_standard_error": standard_error,
+        "expected_utility_control_variate": cv_expected_utility,
+        "expected_utility_control_variate_standard_error": cv_standard_error,
+        "certainty_equivalent_consumption": certainty_equivalent,
+        "certainty_equivalent_consumption_standard_error": certainty_equivalent_error,
+        "quantiles": {
+            metric: summary.quantile_frame(
+                metric,
+                SUMMARY_QUANTILES if metric in summary.quantile_metrics else [],
+            ).to_dicts()
+            for metric in summary.metrics
+        },
+    }
+    output.write_text(json.dumps(result, indent=2))
+
+
+def run_solve(config: dict, output: Path) -> None:
+    import numpy as np
+
+    from findec import dp
+
+    kwargs = dict(config["dp"])
+    solver = kwargs.pop("solver")
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver {solver!r}; expected one of {sorted(SOLVERS)}")
+    if "risky_asset" in kwargs:
+        from findec.returns import DistributionType, RiskyAsset
+
+        risky_asset = dict(kwargs["risky_asset"])
+        if "distribution_type" in risky_asset:
+            risky_asset["distribution_type"] = DistributionType[
+                risky_asset["distribution_type"]
+            ]
+        kwargs["risky_asset"] = RiskyAsset(**risky_asset)
+    solution = getattr(dp, f"solve_{solver}")(**kwargs)
+    np.savez(output, **dict(zip(SOLVERS[solver], solution)))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="findec", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (
+        ("simulate", "Simulate life paths with simulate_life_paths"),
+        ("solve", "Solve a consumption problem with findec.dp"),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("config", type=Path, help="TOML or JSON job config")
+        command.add_argument("--output", "-o", type=Path, required=True)
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    if args.command == "simulate":
+        run_simulation(config, args.output)
+    else:
+        run_solve(config, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
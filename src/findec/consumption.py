@@ -1,4 +1,6 @@
-from findec.assets import Assets
+import numpy as np
+
+from findec.assets import Assets, AssetsBatch
 
 
 def optimal_consumption_infinite_horizon(
@@ -10,21 +12,21 @@ def optimal_consumption_infinite_horizon(
 def optimal_consumption_finite_horizon(
     return_risk_adjusted: float,
     rate_time_preference: float,
-    gamma: float,
-    time_horizon: float | int,
+    gamma: float | np.ndarray,
+    time_horizon: float | int | np.ndarray,
     bequest_param: float | None,
 ):
     c_infty = optimal_consumption_infinite_horizon(
         return_risk_adjusted, rate_time_preference, gamma
     )
-    if time_horizon == 0:
+    if np.any(np.asarray(time_horizon) == 0):
         raise ValueError("time_horizon = 0 implies infinite consumption!")
 
     if bequest_param is not None:
         """Although not written explicitly, this is how I interpret the footnote on p138 of
         Haghani & White
         """
-        time_horizon += bequest_param
+        time_horizon = time_horizon + bequest_param
 
     return c_infty / (1 - (1 + c_infty) ** (-time_horizon))
 
@@ -87,3 +89,75 @@ def consume_from_assets(
             assets.tax_free -= shortfall
 
     return net_consumption
+
+
+def withdraw_taxable_first(
+    *,
+    fractional_consumption: float | np.ndarray,
+    tax_free: np.ndarray,
+    taxable: np.ndarray,
+    taxable_basis: np.ndarray,
+    tax_rate: float | np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Array version of `consume_from_assets`, on the accounts' balances. Returns
+    (net_consumption, tax_free, taxable, taxable_basis) after the withdrawal.
+
+    Accounts whose taxable holdings cover the withdrawal sell from them alone; the
+    others sell all their taxable holdings and take the rest of the withdrawal, net of
+    the capital gains tax, from tax-free. Raises ValueError if any account's balances
+    fall by more or less than it consumed plus the tax it paid, beyond rounding in the
+    balances' dtype.
+    """
+    withdrawal = fractional_consumption * (tax_free + taxable)
+    covered = taxable > withdrawal
+    from_taxable = np.where(covered, withdrawal, taxable)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac_sold = np.where(taxable > 0, from_taxable / taxable, 0.0)
+    realized_gain = frac_sold * (taxable - taxable_basis)
+    # Capital losses are not offset against anything
+    tax_owed = tax_rate * np.maximum(realized_gain, 0.0)
+    net_consumption = from_taxable - tax_owed
+
+    shortfall = np.where(covered, 0.0, withdrawal - net_consumption)
+    from_tax_free = np.minimum(shortfall, tax_free)
+    net_consumption = net_consumption + from_tax_free
+
+    taxable_after = taxable - from_taxable
+    tax_free_after = tax_free - from_tax_free
+    error = (taxable - taxable_after) + (tax_free - tax_free_after) - (
+        net_consumption + tax_owed
+    )
+    rounding = 16 * np.finfo(error.dtype).eps * np.maximum(1.0, tax_free + taxable)
+    not_conserved = np.abs(error) > np.maximum(
+        1e-8 * np.maximum(1.0, withdrawal), rounding
+    )
+    if not_conserved.any():
+        raise ValueError(
+            f"Money not conserved in {np.count_nonzero(not_conserved)} accounts; "
+            f"largest discrepancy {np.max(np.abs(error))}"
+        )
+    return net_consumption, tax_free_after, taxable_after, taxable_basis * (1 - frac_sold)
+
+
+def consume_from_assets_batch(
+    *,
+    fractional_consumption: float | np.ndarray,
+    assets: AssetsBatch,
+    tax_rate: float | np.ndarray,
+) -> np.ndarray:
+    """`consume_from_assets` for every account in `assets` at once: withdraws
+    `fractional_consumption` of each account's wealth, updates `assets` and returns the
+    net consumption per account"""
+    (
+        net_consumption,
+        assets.tax_free,
+        assets.taxable,
+        assets.taxable_basis,
+    ) = withdraw_taxable_first(
+        fractional_consumption=fractional_consumption,
+        tax_free=assets.tax_free,
+        taxable=assets.taxable,
+        taxable_basis=assets.taxable_basis,
+        tax_rate=tax_rate,
+    )
+    return net_consumption
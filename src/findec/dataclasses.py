@@ -1,4 +1,11 @@
-from dataclasses import dataclass, asdict
+from collections.abc import Iterator, Mapping, Sequence
+from dataclasses import dataclass, asdict, fields
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import polars as pl
 
 
 @dataclass
@@ -37,3 +44,75 @@ class State:
 
     def as_dict(self):
         return asdict(self)
+
+
+STATE_FIELDS = [f.name for f in fields(State)]
+
+
+class PathRecord(Mapping[int, State]):
+    """Columnar record of one life path: a preallocated float array with one row per
+    year and one column per `State` field (in `STATE_FIELDS` order), of which the first
+    `len(self)` rows are filled. Ages and alive flags are stored exactly as floats.
+
+    Reading `record[age]` builds a `State` on the fly, so the record can be used like
+    the `dict[int, State]` it replaces. Missing values are stored as NaN and read back
+    as None.
+    """
+
+    def __init__(self, *, starting_age: int, time_horizon_max: int):
+        self.starting_age = starting_age
+        self.values = np.full((time_horizon_max + 1, len(STATE_FIELDS)), np.nan)
+        self.n_rows = 0
+
+    def append(self, **values: float | int | bool | None):
+        self.n_rows += 1
+        self.replace_last(**values)
+
+    def replace_last(self, **values: float | int | bool | None):
+        """Overwrite the last row with every `State` field; None is stored as NaN"""
+        self.values[self.n_rows - 1] = [values[name] for name in STATE_FIELDS]
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.starting_age, self.starting_age + self.n_rows))
+
+    def __getitem__(self, age: int) -> State:
+        i = age - self.starting_age
+        if not 0 <= i < self.n_rows:
+            raise KeyError(age)
+        row = {
+            name: None if value != value else value  # NaN -> None
+            for name, value in zip(STATE_FIELDS, self.values[i].tolist())
+        }
+        row["age"] = int(row["age"])
+        row["alive"] = bool(row["alive"])
+        return State(**row)
+
+    def to_frame(self) -> "pl.DataFrame":
+        return path_records_frame([self])
+
+
+def path_records_frame(
+    records: Sequence[PathRecord], run_numbers: Sequence[int] | None = None
+) -> "pl.DataFrame":
+    """One frame of the filled rows of `records`, in order, built in one go; float NaNs
+    become nulls. With `run_numbers`, each record's rows get its number in an Int64
+    run_number column."""
+    import polars as pl
+
+    values = np.concatenate([record.values[: record.n_rows] for record in records])
+    columns = {}
+    for j, f in enumerate(fields(State)):
+        if f.type is int:
+            columns[f.name] = values[:, j].astype(np.int64)
+        elif f.type is bool:
+            columns[f.name] = values[:, j].astype(bool)
+        else:
+            columns[f.name] = values[:, j]
+    df = pl.DataFrame(columns, nan_to_null=True)
+    if run_numbers is not None:
+        run_number = np.repeat(run_numbers, [record.n_rows for record in records])
+        df = df.with_columns(pl.Series("run_number", run_number, dtype=pl.Int64()))
+    return df
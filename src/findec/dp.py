@@ -0,0 +1,354 @@
+"""Backward-induction solvers for the lifetime consumption (and investment) problems of
+notebooks 4 and 5.
+
+Each time step is evaluated as one array operation over (wealth, c[, k, scenario])
+instead of nested Python loops. Wealth nodes are processed `chunk_size` at a time to
+bound memory. The grids, tie-breaking and interpolation follow the notebook versions, so
+the solutions agree with them.
+
+`solve_consumption_egm` solves the consumption problem with the endogenous grid method
+instead: consumption is continuous and found by inverting the Euler equation, so there
+is no search over candidate consumption fractions.
+
+`solve_consumption_investment` takes a `warm_start`: the solution of a neighbouring
+problem (say a slightly different gamma). Each wealth node then only searches the
+(c, k) pairs within `search_width` grid steps of that solution's choice. Where the best
+of those is on the edge of the window, the window moves to it and widens once, and
+then falls back to the full search. This is a heuristic: the objective isn't always
+unimodal in (c, k), so a warm-started solve can settle on a local optimum that is worse
+than the cold solve's; it is never better. `solve_sequence` chains solves across a list
+of parameter sets, warm started only if asked.
+
+`solve_consumption` has no warm start. Its objective looks up next period's value at
+the nearest grid point above, which makes it jagged in c: local searches there miss the
+cold optimum badly, and its full search is cheap anyway.
+"""
+
+from collections.abc import Callable, Mapping, Sequence
+
+import numpy as np
+
+from findec.returns import RiskyAsset
+from findec.utility import bequest_utility, crra_utility
+
+
+def wealth_grid(*, W0: float, growth_rate: float, T: int, n_grid: int) -> np.ndarray:
+    W_max = W0 * (1 + growth_rate) ** T * 2.0  # factor of 2 is just for some margin
+    return np.linspace(1e-3, W_max, n_grid)
+
+
+def _chunks(n: int, chunk_size: int):
+    for start in range(0, n, chunk_size):
+        yield slice(start, min(start + chunk_size, n))
+
+
+def _policy_index(
+    policy: np.ndarray, *, n_candidates: int, shape: tuple[int, int]
+) -> np.ndarray:
+    """Indices into np.linspace(0, 1, n_candidates) of a warm start's policy"""
+    if policy.shape != shape:
+        raise ValueError(
+            f"Warm start policy has shape {policy.shape}, not {shape}; it must come "
+            "from a solve with the same T and n_grid"
+        )
+    return np.rint(policy * (n_candidates - 1)).astype(np.intp)
+
+
+def _windowed_search(
+    rows: slice,
+    *,
+    previous: list[np.ndarray],
+    sizes: tuple[int, ...],
+    width: int,
+    window_value: Callable[[np.ndarray, list[np.ndarray]], np.ndarray],
+    full_search: Callable[[np.ndarray], tuple[np.ndarray, list[np.ndarray]]],
+) -> tuple[np.ndarray, list[np.ndarray]]:
+    """Best value and choice (one index array per choice dimension) for wealth nodes
+    `rows`, searching within `width` of the `previous` choices. `window_value` gives the
+    value of the candidates of wealth nodes, as (n_nodes, n_candidates) index arrays per
+    dimension. Where the best is on the window's edge, but not the grid's, the window is
+    re-centred on it and doubled in width, until it would hold at least half the grid
+    and `full_search` is used instead. That bounds a warm search at about 1.3 times a
+    full one."""
+    rows = np.arange(rows.start, rows.stop)
+    centre = [p[rows] for p in previous]
+    value = np.empty(len(rows))
+    best = [np.empty(len(rows), dtype=np.intp) for _ in sizes]
+    pending = np.arange(len(rows))
+    while pending.size:
+        if (2 * width + 1) ** len(sizes) >= np.prod(sizes) / 2:
+            value[pending], wide_best = full_search(rows[pending])
+            for b, w in zip(best, wide_best):
+                b[pending] = w
+            break
+        offsets = np.arange(-width, width + 1)
+        grids = np.meshgrid(*[offsets] * len(sizes), indexing="ij")
+        candidates = [
+            np.clip(c[pending, None] + g.ravel()[None, :], 0, n - 1)
+            for c, g, n in zip(centre, grids, sizes)
+        ]
+        total_value = window_value(rows[pending], candidates)
+        pick = total_value.argmax(axis=1)[:, None]
+        value[pending] = np.take_along_axis(total_value, pick, axis=1)[:, 0]
+        on_edge = np.zeros(len(pending), dtype=bool)
+        for b, c, cand, n in zip(best, centre, candidates, sizes):
+            b[pending] = chosen = np.take_along_axis(cand, pick, axis=1)[:, 0]
+            on_edge |= ((chosen == c[pending] - width) & (chosen > 0)) | (
+                (chosen == c[pending] + width) & (chosen < n - 1)
+            )
+            c[pending] = chosen
+        pending = pending[on_edge]
+        width *= 2
+    return value, best
+
+
+def solve_consumption(
+    *,
+    W0: float,
+    r_ra: float,
+    r_tp: float,
+    gamma: float,
+    T: int,
+    n_grid: int,
+    c_grid_size: int,
+    chunk_size: int = 1024,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """Riskless consumption problem (notebook 4): choose the fraction of wealth to consume
+    each year, with wealth growing at the risk-adjusted return r_ra and no bequest.
+
+    Returns (C, V, W_grid, optimal_c_init), where V[t, i] is the value and C[t, i] the
+    optimal consumption fraction at time t with wealth W_grid[i].
+    """
+    W_grid = wealth_grid(W0=W0, growth_rate=r_ra, T=T, n_grid=n_grid)
+    V = np.zeros((T + 2, n_grid))
+    C = np.zeros((T + 2, n_grid))
+    discount_factors = (1 + r_tp) ** np.arange(T + 2)
+    c_candidates = np.linspace(0, 1, c_grid_size)
+
+    # Consumption and next wealth don't depend on t, so neither do the immediate utility
+    # or the (nearest grid point at or above) next wealth index
+    cons = W_grid[:, None] * c_candidates[None, :]
+    U = crra_utility(cons, gamma=gamma)
+    W_next = (W_grid[:, None] - cons) * (1 + r_ra)
+    W_next_index = np.minimum(np.searchsorted(W_grid, W_next), n_grid - 1)
+
+    for t in reversed(range(1, T + 1)):
+        for rows in _chunks(n_grid, chunk_size):
+            total_value = U[rows] / discount_factors[t] + V[t + 1][W_next_index[rows]]
+            best = total_value.argmax(axis=1)
+            V[t, rows] = np.take_along_axis(total_value, best[:, None], axis=1)[:, 0]
+            C[t, rows] = c_candidates[best]
+
+    i_closest = np.argmin(np.abs(W_grid - W0))
+    optimal_c_init = C[1, i_closest]
+    return C, V, W_grid, optimal_c_init
+
+
+def solve_consumption_investment(
+    W0: float = 1_000_000,
+    r_tp: float = 0.02,
+    gamma: float = 2.0,
+    T: int = 35,
+    n_grid: int = 200,
+    c_grid_size: int = 21,
+    k_grid_size: int = 21,
+    R_r_vals: np.ndarray | list[float] = (-0.20, 0.00, 0.10, 0.20),
+    R_r_probs: np.ndarray | list[float] = (0.10, 0.40, 0.40, 0.10),
+    r_f: float = 0.03,
+    chunk_size: int = 256,
+    risky_asset: RiskyAsset | None = None,
+    n_quadrature_nodes: int = 7,
+    warm_start: tuple | None = None,
+    search_width: int = 2,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, tuple[float, float]]:
+    """Consumption and risky-allocation problem (notebook 5), with the risky return
+    taking the values `R_r_vals` with probabilities `R_r_probs`.
+
+    If `risky_asset` is given, its `n_quadrature_nodes`-point quadrature rule is used in
+    place of `R_r_vals`/`R_r_probs`, so the expectation is over the same return model
+    the simulator draws from.
+
+    With `warm_start`, a solution returned by this function with the same T, n_grid,
+    c_grid_size and k_grid_size, only the (c, k) pairs within `search_width` steps of
+    its choices in both directions are searched, widening where needed (see the module
+    docstring).
+
+    Returns (V, C_opt, K_opt, W_grid, (c_init, k_init)).
+    """
+    if risky_asset is not None:
+        R_r_vals, R_r_probs = risky_asset.quadrature(n_quadrature_nodes)
+    R_r_vals = np.asarray(R_r_vals, dtype=float)
+    R_r_probs = np.asarray(R_r_probs, dtype=float)
+
+    W_grid = wealth_grid(W0=W0, growth_rate=r_f, T=T, n_grid=n_grid)
+    V = np.zeros((T + 2, n_grid))
+    C_opt = np.zeros((T + 2, n_grid))
+    K_opt = np.zeros((T + 2, n_grid))
+    discount_factors = (1 + r_tp) ** np.arange(T + 2)
+    c_candidates = np.linspace(0, 1, c_grid_size)
+    k_candidates = np.linspace(0, 1, k_grid_size)
+
+    # (k, scenario) gross portfolio returns
+    gross_return = 1 + k_candidates[:, None] * R_r_vals[None, :] + (
+        1 - k_candidates[:, None]
+    ) * r_f
+
+    cons = W_grid[:, None] * c_candidates[None, :]
+    U = crra_utility(cons, gamma=gamma)
+    savings = W_grid[:, None] - cons
+    if warm_start is not None:
+        previous = [
+            _policy_index(policy, n_candidates=n, shape=V.shape)
+            for policy, n in (
+                (warm_start[1], c_grid_size),
+                (warm_start[2], k_grid_size),
+            )
+        ]
+
+    def full_search(rows: slice | np.ndarray) -> tuple[np.ndarray, list[np.ndarray]]:
+        # (wealth, c, k, scenario)
+        W_next = savings[rows, :, None, None] * gross_return[None, None, :, :]
+        v_next = np.interp(W_next, W_grid, V[t + 1])
+        expected_future_value = v_next @ R_r_probs
+        total_value = (
+            U[rows, :, None] / discount_factors[t] + expected_future_value
+        ).reshape(len(W_grid[rows]), -1)
+        # argmax picks the first maximum, matching the notebook's c-then-k loop
+        best = total_value.argmax(axis=1)
+        return (
+            np.take_along_axis(total_value, best[:, None], axis=1)[:, 0],
+            [best // k_grid_size, best % k_grid_size],
+        )
+
+    def window_value(rows: np.ndarray, candidates: list[np.ndarray]) -> np.ndarray:
+        c, k = candidates
+        # (wealth, candidate, scenario)
+        savings_chosen = np.take_along_axis(savings[rows], c, axis=1)
+        W_next = savings_chosen[:, :, None] * gross_return[k]
+        expected_future_value = np.interp(W_next, W_grid, V[t + 1]) @ R_r_probs
+        return (
+            np.take_along_axis(U[rows], c, axis=1) / discount_factors[t]
+            + expected_future_value
+        )
+
+    for t in reversed(range(1, T + 1)):
+        for rows in _chunks(n_grid, chunk_size):
+            if warm_start is None:
+                V[t, rows], (best_c, best_k) = full_search(rows)
+            else:
+                V[t, rows], (best_c, best_k) = _windowed_search(
+                    rows,
+                    previous=[p[t] for p in previous],
+                    sizes=(c_grid_size, k_grid_size),
+                    width=search_width,
+                    window_value=window_value,
+                    full_search=full_search,
+                )
+            C_opt[t, rows] = c_candidates[best_c]
+            K_opt[t, rows] = k_candidates[best_k]
+
+    i_closest = np.argmin(np.abs(W_grid - W0))
+    c_init = C_opt[1, i_closest]
+    k_init = K_opt[1, i_closest]
+    return V, C_opt, K_opt, W_grid, (c_init, k_init)
+
+
+def _interp_extrapolate(x: np.ndarray, xp: np.ndarray, fp: np.ndarray) -> np.ndarray:
+    """np.interp, but extrapolating linearly above xp[-1] instead of clamping"""
+    slope = (fp[-1] - fp[-2]) / (xp[-1] - xp[-2])
+    return np.where(x > xp[-1], fp[-1] + slope * (x - xp[-1]), np.interp(x, xp, fp))
+
+
+def solve_consumption_egm(
+    *,
+    W0: float,
+    r_ra: float,
+    r_tp: float,
+    gamma: float,
+    T: int,
+    n_grid: int,
+    bequest_param: float | None = None,
+    risky_asset: RiskyAsset | None = None,
+    risky_asset_fraction: float = 0.0,
+    n_quadrature_nodes: int = 7,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """Consumption problem of `solve_consumption` with `crra_utility`, solved by the
+    endogenous grid method.
+
+    With `bequest_param` set, wealth left after year T is valued with `bequest_utility`
+    (discounted as in year T + 1) instead of being worth nothing. With `risky_asset` set,
+    a fixed `risky_asset_fraction` of savings earns its return, integrated with
+    `risky_asset.quadrature`, and the rest earns r_ra.
+
+    Returns (C, V, W_grid, optimal_c_init) in the layout of `solve_consumption`.
+    """
+    W_grid = wealth_grid(W0=W0, growth_rate=r_ra, T=T, n_grid=n_grid)
+    V = np.zeros((T + 2, n_grid))
+    C = np.zeros((T + 2, n_grid))
+    discount_factors = (1 + r_tp) ** np.arange(T + 2)
+    beta = 1 / (1 + r_tp)
+
+    if risky_asset is None:
+        gross_return, probabilities = np.array([1 + r_ra]), np.array([1.0])
+    else:
+        risky_return, probabilities = risky_asset.quadrature(n_quadrature_nodes)
+        gross_return = (
+            1 + risky_asset_fraction * risky_return + (1 - risky_asset_fraction) * r_ra
+        )
+
+    if bequest_param is not None:
+        V[T + 1] = (
+            bequest_utility(W_grid, b=bequest_param, gamma=gamma) / discount_factors[T + 1]
+        )
+
+    # Exogenous grid of savings, and the (savings, scenario) wealth they lead to
+    savings = W_grid
+    W_next = savings[:, None] * gross_return[None, :]
+
+    for t in reversed(range(1, T + 1)):
+        if t == T and bequest_param is None:
+            # Nothing is left after year T, so everything is consumed
+            W_nodes = C_nodes = np.concatenate([[0.0], W_grid])
+        else:
+            if t == T:
+                # Marginal utility of the bequest
+                marginal_utility_next = (W_next / bequest_param) ** -gamma
+            else:
+                c_next = _interp_extrapolate(W_next, W_nodes, C_nodes)
+                marginal_utility_next = c_next**-gamma
+            # Euler equation: u'(c_t) = beta * E[R * u'(c_{t+1})], with u'(c) = c^-gamma
+            expected = marginal_utility_next @ (gross_return * probabilities)
+            consumption = (beta * expected) ** (-1 / gamma)
+            # Wealth at which saving `savings` is optimal. u'(0) is infinite, so
+            # consumption goes to zero with wealth
+            W_nodes = np.concatenate([[0.0], savings + consumption])
+            C_nodes = np.concatenate([[0.0], consumption])
+
+        c = _interp_extrapolate(W_grid, W_nodes, C_nodes)
+        C[t] = c / W_grid
+        v_next = np.interp((W_grid - c)[:, None] * gross_return[None, :], W_grid, V[t + 1])
+        V[t] = crra_utility(c, gamma=gamma) / discount_factors[t] + v_next @ probabilities
+
+    i_closest = np.argmin(np.abs(W_grid - W0))
+    optimal_c_init = C[1, i_closest]
+    return C, V, W_grid, optimal_c_init
+
+
+def solve_sequence(
+    solver: Callable[..., tuple],
+    parameter_sets: Sequence[Mapping],
+    *,
+    warm_start: bool = False,
+    **kwargs,
+) -> list[tuple]:
+    """Solve `solver` for each of `parameter_sets` in turn, each on top of `kwargs`, and
+    return the solutions in order. With `warm_start`, every solve after the first is
+    warm started from the one before, so neighbouring parameter sets should be next to
+    each other (e.g. gamma in increasing order); `solver` must then take a
+    `warm_start`."""
+    solutions = []
+    for parameters in parameter_sets:
+        if warm_start and solutions:
+            parameters = {**parameters, "warm_start": solutions[-1]}
+        solutions.append(solver(**kwargs, **parameters))
+    return solutions
@@ -1,17 +1,28 @@
+from dataclasses import dataclass
+from typing import Protocol
+
+import numpy as np
+
 from findec.consumption import optimal_consumption_finite_horizon
 from findec.returns import risk_adjusted_excess_return, RiskyAsset
 from findec.dataclasses import Preferences, Policy
+from findec.survival import mortality_table
 
 
-def merton_share(*, expected_excess_return: float, gamma: float, std_dev_return: float):
+def merton_share(
+    *,
+    expected_excess_return: float,
+    gamma: float | np.ndarray,
+    std_dev_return: float,
+):
     """Optimal frac_risky_assert for risky asset"""
     return expected_excess_return / (gamma * std_dev_return**2)
 
 
 def policy(
     *,
-    time_horizon: float | int,
-    gamma: float,
+    time_horizon: float | int | np.ndarray,
+    gamma: float | np.ndarray,
     pref: Preferences,
     risk_free_rate: float,
     risky_asset: RiskyAsset,
@@ -44,3 +55,157 @@ def policy(
         consumption_fraction=consumption_fraction,
         risky_asset_fraction=k,
     )
+
+
+@dataclass
+class PolicyTable:
+    """The Merton policy for every year t = 0..time_horizon_max of a simulation, in both
+    gamma regimes, together with the per-year discount factors. Regime 0 is at or above
+    subsistence, regime 1 below it.
+
+    `policy` only depends on the year (through the time horizon) and on gamma, which
+    takes one of two values, so a simulation only needs to look values up.
+    """
+
+    subsistence: float
+    gamma: np.ndarray  # (2,)
+    consumption_fraction: np.ndarray  # (n_years, 2)
+    risky_asset_fraction: np.ndarray  # (n_years, 2)
+    inflation_discount_factor: np.ndarray  # (n_years,)
+    utility_discount: np.ndarray  # (n_years,), (1 + rate_time_preference) ** t
+
+    def regime(self, wealth_post_inflation: np.ndarray | float) -> np.ndarray:
+        return (np.asarray(wealth_post_inflation) < self.subsistence).astype(np.intp)
+
+    def to_lists(self) -> "PolicyTableLists":
+        return PolicyTableLists(
+            subsistence=float(self.subsistence),
+            gamma=self.gamma.tolist(),
+            consumption_fraction=self.consumption_fraction.tolist(),
+            risky_asset_fraction=self.risky_asset_fraction.tolist(),
+            utility_discount=self.utility_discount.tolist(),
+        )
+
+    def fractions(
+        self,
+        t: int,
+        regime: np.ndarray | int,
+        wealth_post_inflation: np.ndarray | float,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        return (
+            self.consumption_fraction[t, regime],
+            self.risky_asset_fraction[t, regime],
+        )
+
+
+@dataclass
+class PolicyTableLists:
+    """A `PolicyTable` as Python floats, for the scalar engine. One path-year at a
+    time, indexing numpy arrays and converting the results back to floats costs more
+    than the simulation's own arithmetic."""
+
+    subsistence: float
+    gamma: list[float]
+    consumption_fraction: list[list[float]]
+    risky_asset_fraction: list[list[float]]
+    utility_discount: list[float]
+
+    def regime(self, wealth_post_inflation: float) -> int:
+        return 1 if wealth_post_inflation < self.subsistence else 0
+
+    def fractions(
+        self, t: int, regime: int, wealth_post_inflation: float
+    ) -> tuple[float, float]:
+        return (
+            self.consumption_fraction[t][regime],
+            self.risky_asset_fraction[t][regime],
+        )
+
+
+class PolicyRule(Protocol):
+    """What the simulators need from a policy: the consumption and risky-asset
+    fractions in year t, for paths in gamma `regime` with inflation-adjusted wealth
+    `wealth_post_inflation` (after income, before growth)."""
+
+    def fractions(
+        self,
+        t: int,
+        regime: np.ndarray | int,
+        wealth_post_inflation: np.ndarray | float,
+    ) -> tuple[np.ndarray, np.ndarray]: ...
+
+
+@dataclass
+class GridPolicy:
+    """A policy tabulated over (year, wealth), e.g. `C_opt`/`K_opt` from
+    `findec.dp.solve_consumption_investment`. Row t is used in simulated year t, and
+    fractions are linearly interpolated in wealth (clamped at the ends of the grid)."""
+
+    W_grid: np.ndarray  # (n_grid,), increasing
+    consumption_fraction: np.ndarray  # (n_years, n_grid)
+    risky_asset_fraction: np.ndarray  # (n_years, n_grid)
+
+    def fractions(
+        self,
+        t: int,
+        regime: np.ndarray | int,
+        wealth_post_inflation: np.ndarray | float,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        return (
+            np.interp(wealth_post_inflation, self.W_grid, self.consumption_fraction[t]),
+            np.interp(wealth_post_inflation, self.W_grid, self.risky_asset_fraction[t]),
+        )
+
+
+def time_horizons(
+    *,
+    starting_age: int,
+    time_horizon_max: int,
+    with_longevity_uncertainty: bool,
+    is_male: bool,
+) -> np.ndarray:
+    """Planning horizon used by the policy in each year t = 0..time_horizon_max"""
+    t = np.arange(time_horizon_max + 1)
+    if not with_longevity_uncertainty:
+        return (time_horizon_max - t + 1).astype(float)
+    mortality = mortality_table(is_male)
+    return mortality.life_expectancy[np.minimum(starting_age + t, mortality.max_age)]
+
+
+def build_policy_table(
+    *,
+    pref: Preferences,
+    risk_free_rate: float,
+    risky_asset: RiskyAsset,
+    inflation_rate: float,
+    starting_age: int,
+    time_horizon_max: int,
+    with_longevity_uncertainty: bool,
+    is_male: bool,
+) -> PolicyTable:
+    gamma = np.array([pref.gamma_above_subsistence, pref.gamma_below_subsistence])
+    horizons = time_horizons(
+        starting_age=starting_age,
+        time_horizon_max=time_horizon_max,
+        with_longevity_uncertainty=with_longevity_uncertainty,
+        is_male=is_male,
+    )
+    pol = policy(
+        time_horizon=horizons[:, None],
+        gamma=gamma[None, :],
+        pref=pref,
+        risk_free_rate=risk_free_rate,
+        risky_asset=risky_asset,
+        bequest_param=pref.bequest_param,
+    )
+    t = np.arange(time_horizon_max + 1)
+    return PolicyTable(
+        subsistence=pref.subsistence,
+        gamma=gamma,
+        consumption_fraction=np.asarray(pol.consumption_fraction),
+        risky_asset_fraction=np.broadcast_to(
+            pol.risky_asset_fraction, (len(t), 2)
+        ).copy(),
+        inflation_discount_factor=(1 - inflation_rate) ** t,
+        utility_discount=(1 + pref.rate_time_preference) ** t,
+    )
@@ -0,0 +1,157 @@
+"""When is single precision accurate enough?
+
+`simulate_life_paths(..., vectorized=True, dtype=np.float32)` halves the memory traffic
+of the batch engine. `compare_precision` simulates the same paths in float32 and in
+float64 and compares the expected utility and the consumption certainty equivalent in
+units of the float64 standard error: float32 is safe for a configuration when the
+difference is a small fraction of the Monte Carlo noise. `kernel_precision` compares
+the utility kernels directly over a wide range of wealth, which shows where float32
+overflows into `UTILITY_FLOOR` (small consumption, or bequests far below the bequest
+parameter, with large gamma_below_subsistence) while float64 doesn't.
+
+    python -m findec.precision
+
+runs both on the configurations in `CASES`.
+"""
+
+import argparse
+import sys
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+import polars as pl
+
+from findec.assets import Assets
+from findec.dataclasses import Preferences
+from findec.reference import reference_kwargs
+from findec.simulate import simulate_life_paths
+from findec.utility import UTILITY_FLOOR, bequest_utility, crra_utility
+
+# A difference of at most this many float64 standard errors counts as safe
+TOLERANCE_DEFAULT = 0.1
+
+# Overrides of `findec.reference.reference_kwargs`
+CASES = {
+    "reference": {},
+    # Without social security, $100k soon falls below subsistence, so the large
+    # gamma_below_subsistence applies to most years and to small bequests
+    "large_gamma_below_subsistence": {
+        "pref": Preferences(gamma_below_subsistence=15.0),
+        "assets": Assets(tax_free=50_000.0, taxable=50_000.0, inflation_rate=0.02),
+        "social_security": 0.0,
+    },
+}
+
+
+def _estimates(summary) -> dict[str, tuple[float, float]]:
+    return {
+        "expected_utility": summary.expected_utility(),
+        "certainty_equivalent": summary.certainty_equivalent(),
+    }
+
+
+def compare_precision(
+    *,
+    n_sims: int = 100_000,
+    batch_size: int = 10_000,
+    cases: Mapping[str, dict] | None = None,
+    tolerance: float = TOLERANCE_DEFAULT,
+    rng_seed_offset: int = 0,
+) -> pl.DataFrame:
+    """One row per case and target (expected utility, certainty equivalent), with the
+    float64 and float32 estimates of the same `n_sims` paths, their difference in
+    float64 standard errors, and whether that is at most `tolerance`"""
+    rows = []
+    for case, overrides in (CASES if cases is None else cases).items():
+        kwargs = {**reference_kwargs(), **overrides}
+        estimates = {
+            dtype: _estimates(
+                simulate_life_paths(
+                    n_sims=n_sims,
+                    vectorized=True,
+                    batch_size=batch_size,
+                    summary=True,
+                    rng_seed_offset=rng_seed_offset,
+                    dtype=dtype,
+                    **kwargs,
+                )
+            )
+            for dtype in (np.float64, np.float32)
+        }
+        for target, (estimate, standard_error) in estimates[np.float64].items():
+            estimate_float32, _ = estimates[np.float32][target]
+            difference = estimate_float32 - estimate
+            rows.append(
+                {
+                    "case": case,
+                    "target": target,
+                    "float64": estimate,
+                    "float32": estimate_float32,
+                    "difference": difference,
+                    "standard_error": standard_error,
+                    "standard_errors": abs(difference) / standard_error,
+                    "safe": bool(abs(difference) <= tolerance * standard_error),
+                }
+            )
+    return pl.DataFrame(rows)
+
+
+def kernel_precision(
+    *,
+    gammas: Sequence[float] = (2.0, 5.0, 15.0, 30.0),
+    wealth: np.ndarray | None = None,
+    bequest_param: float = 10.0,
+) -> pl.DataFrame:
+    """One row per utility kernel and gamma: the largest relative error of float32
+    against float64 over `wealth` (by default 1e-10 to 1e8), leaving out points where
+    either is at `UTILITY_FLOOR`; the number of points where only float32 is; and the
+    largest such wealth, below which float32 isn't safe (NaN if there are none)."""
+    if wealth is None:
+        wealth = np.logspace(-10, 8, 1801)
+    kernels = {
+        "crra_utility": lambda w, gamma, dtype: crra_utility(w, gamma=gamma, dtype=dtype),
+        "bequest_utility": lambda w, gamma, dtype: bequest_utility(
+            w, b=bequest_param, gamma=gamma, dtype=dtype
+        ),
+    }
+    rows = []
+    for name, kernel in kernels.items():
+        for gamma in gammas:
+            u64 = kernel(wealth, gamma, np.float64)
+            u32 = kernel(wealth, gamma, np.float32).astype(np.float64)
+            floored64, floored32 = u64 == UTILITY_FLOOR, u32 == UTILITY_FLOOR
+            compared = ~(floored64 | floored32)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                relative_error = np.abs(u32 - u64)[compared] / np.abs(u64[compared])
+            overflowed = floored32 & ~floored64
+            rows.append(
+                {
+                    "kernel": name,
+                    "gamma": gamma,
+                    "max_relative_error": float(
+                        np.nanmax(relative_error, initial=0.0)
+                    ),
+                    "float32_floored": int(np.count_nonzero(overflowed)),
+                    "float32_floored_below": (
+                        float(wealth[overflowed].max()) if overflowed.any() else np.nan
+                    ),
+                }
+            )
+    return pl.DataFrame(rows)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-sims", type=int, default=100_000)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE_DEFAULT)
+    args = parser.parse_args(argv)
+
+    with pl.Config(tbl_rows=-1, tbl_cols=-1, tbl_width_chars=200):
+        print(kernel_precision())
+        comparison = compare_precision(n_sims=args.n_sims, tolerance=args.tolerance)
+        print(comparison)
+    return 0 if comparison["safe"].all() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Opt-in per-stage profiling of the simulation engines.
+
+The engines wrap each stage of a simulated year (drawing the lifetime, looking up the
+regime and the policy, drawing returns, growing and consuming from assets, evaluating
+utility and recording the state) in `stage_timer()(name)`. Outside `profile_stages()`
+that is a shared no-op context manager, so the hooks cost next to nothing; inside it,
+every stage's time, call count and change in allocated memory blocks are accumulated:
+
+    with profile_stages() as profiler:
+        simulate_life_paths(n_sims=1_000, **kwargs)
+    profiler.to_frame()
+
+Profiling is in-process only, so it can't be combined with `workers`.
+"""
+
+import contextlib
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import polars as pl
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    total_time: float = 0.0  # seconds
+    # Net change in blocks allocated by Python's allocator (including small numpy
+    # arrays' headers, but not the data of large arrays)
+    allocated_blocks: int = 0
+    # Net change in bytes traced by tracemalloc, if it was tracing
+    traced_memory: int = 0
+
+    def merge(self, other: "StageStats"):
+        self.calls += other.calls
+        self.total_time += other.total_time
+        self.allocated_blocks += other.allocated_blocks
+        self.traced_memory += other.traced_memory
+
+
+class _StageTimer:
+    """Adds one timed call to `stats` per `with` block. Not reentrant: stages don't
+    nest within themselves."""
+
+    def __init__(self, stats: StageStats, trace_memory: bool):
+        self.stats = stats
+        self.trace_memory = trace_memory
+        # Blocks and bytes the timer itself frees per call (the previous call's
+        # readings), measured on an empty stage once the readings exist
+        self.own_blocks = self.own_memory = 0
+        for _ in range(2):
+            self.stats = StageStats()
+            with self:
+                pass
+        self.own_blocks = self.stats.allocated_blocks
+        self.own_memory = self.stats.traced_memory
+        self.stats = stats
+
+    def __enter__(self):
+        if self.trace_memory:
+            self.memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        self.blocks = sys.getallocatedblocks()
+
+    def __exit__(self, *exc_info):
+        blocks = sys.getallocatedblocks()
+        elapsed = time.perf_counter() - self.start
+        if self.trace_memory:
+            memory = tracemalloc.get_traced_memory()[0]
+            self.stats.traced_memory += memory - self.memory - self.own_memory
+        self.stats.total_time += elapsed
+        self.stats.allocated_blocks += blocks - self.blocks - self.own_blocks
+        self.stats.calls += 1
+
+
+class StageProfiler:
+    """Cumulative `StageStats` per named stage. With `trace_memory`, `tracemalloc` runs
+    while the profiler is active, which is much slower but also counts bytes."""
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stats: dict[str, StageStats] = {}
+        self._timers: dict[str, _StageTimer] = {}
+
+    def stage(self, name: str) -> AbstractContextManager:
+        timer = self._timers.get(name)
+        if timer is None:
+            self.stats[name] = StageStats()
+            timer = self._timers[name] = _StageTimer(self.stats[name], self.trace_memory)
+        return timer
+
+    def merge(self, other: "StageProfiler") -> "StageProfiler":
+        for name, stats in other.stats.items():
+            self.stage(name)
+            self.stats[name].merge(stats)
+        return self
+
+    def to_dict(self) -> dict[str, dict]:
+        return {name: asdict(stats) for name, stats in self.stats.items()}
+
+    def to_frame(self) -> "pl.DataFrame":
+        """One row per stage, slowest first"""
+        import polars as pl
+
+        return (
+            pl.DataFrame(
+                [{"stage": name, **asdict(stats)} for name, stats in self.stats.items()],
+                schema={
+                    "stage": pl.Utf8,
+                    "calls": pl.Int64,
+                    "total_time": pl.Float64,
+                    "allocated_blocks": pl.Int64,
+                    "traced_memory": pl.Int64,
+                },
+            )
+            .with_columns(
+                (pl.col("total_time") / pl.col("calls")).alias("mean_time"),
+                (pl.col("total_time") / pl.col("total_time").sum()).alias("share"),
+            )
+            .sort("total_time", descending=True)
+        )
+
+
+_active: StageProfiler | None = None
+
+
+def active_profiler() -> StageProfiler | None:
+    return _active
+
+
+def _no_stage(name: str) -> AbstractContextManager:
+    return _NO_STAGE
+
+
+def stage_timer() -> Callable[[str], AbstractContextManager]:
+    """`stage` of the active profiler, or a no-op if there is none. Look it up once per
+    simulation, not once per stage."""
+    return _no_stage if _active is None else _active.stage
+
+
+@contextmanager
+def profile_stages(trace_memory: bool = False) -> Iterator[StageProfiler]:
+    """Profile the stages of every simulation run inside the `with` block"""
+    global _active
+    profiler = StageProfiler(trace_memory=trace_memory)
+    previous, _active = _active, profiler
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        yield profiler
+    finally:
+        _active = previous
+        if started_tracing:
+            tracemalloc.stop()
@@ -0,0 +1,19 @@
+"""The reference configuration that the benchmarks and precision checks simulate."""
+
+from findec.assets import Assets
+from findec.dataclasses import Preferences
+
+
+def reference_kwargs(*, with_longevity_uncertainty: bool = True) -> dict:
+    """The notebooks' retiree: $1m split between accounts, from age 65 for 35 years"""
+    return dict(
+        expected_return_risky=0.09,
+        std_dev_return_risky=0.20,
+        risk_free_rate=0.04,
+        tax_rate=0.2,
+        pref=Preferences(),
+        assets=Assets(tax_free=400_000.0, taxable=600_000.0, inflation_rate=0.02),
+        social_security=30_000.0,
+        time_horizon_max=35,
+        with_longevity_uncertainty=with_longevity_uncertainty,
+    )
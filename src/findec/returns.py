@@ -1,18 +1,69 @@
+import math
+from collections.abc import Callable
 from dataclasses import dataclass
 import numpy as np
+import numpy.typing as npt
 from enum import Enum, auto
 
+# scipy is imported where it's needed: it is slow to import, and plain pseudo-random
+# simulation never needs it
+
 
 class DistributionType(Enum):
     NORMAL = auto()
     LOG_NORMAL = auto()
 
 
+class SamplingMethod(Enum):
+    """How random numbers are generated.
+
+    ANTITHETIC gives paths in pairs (2i, 2i + 1), the second using 1 - u for every
+    uniform u of the first. SOBOL gives a scrambled Sobol' sequence, with one dimension
+    per random number a path needs.
+    """
+
+    PSEUDO_RANDOM = auto()
+    ANTITHETIC = auto()
+    SOBOL = auto()
+
+
+def uniform_sampler(
+    d: int, *, rng: np.random.Generator, sampling: SamplingMethod
+) -> Callable[[int], np.ndarray]:
+    """Function that draws the next n points in [0, 1)^d, as an (n, d) array"""
+    if sampling == SamplingMethod.PSEUDO_RANDOM:
+        return lambda n: rng.random((n, d))
+    elif sampling == SamplingMethod.ANTITHETIC:
+
+        def draw(n: int) -> np.ndarray:
+            u = rng.random(((n + 1) // 2, d))
+            points = np.empty((n, d))
+            points[0::2] = u
+            points[1::2] = 1 - u[: n // 2]
+            return points
+
+        return draw
+    elif sampling == SamplingMethod.SOBOL:
+        from scipy.stats import qmc
+
+        return qmc.Sobol(d=d, scramble=True, seed=rng).random
+    raise ValueError(f"Unknown sampling method {sampling}")
+
+
+def lognormal_parameters(mean_return: float, stdev: float) -> tuple[float, float]:
+    """(mu, sigma) of X ~ Normal(mu, sigma^2) such that R = exp(X) - 1 has the given mean
+    and standard deviation"""
+    sigma_log = np.sqrt(np.log(1 + (stdev**2 / (1 + mean_return) ** 2)))
+    mu_log = np.log(1 + mean_return) - 0.5 * sigma_log**2
+    return mu_log, sigma_log
+
+
 # Got this from chatGPT, but looks sensible. Think more later.
 def draw_lognormal_return(
     mean_return: float,
     stdev: float,
     n_sims: int,
+    rng: np.random.Generator | None = None,
 ) -> np.ndarray:
     # Draw from normal with mean=mean_return, stdev=stdev,
     # then do (1 + normal_draw).
@@ -24,11 +75,11 @@ def draw_lognormal_return(
 
     # So set exp(m + s^2/2) - 1 = mean_return => m + s^2/2 = ln(1 + mean_return).
 
-    sigma_log = np.sqrt(np.log(1 + (stdev**2 / (1 + mean_return) ** 2)))  # approximate
-    mu_log = np.log(1 + mean_return) - 0.5 * sigma_log**2
+    mu_log, sigma_log = lognormal_parameters(mean_return, stdev)
 
     # Now draw X ~ Normal(mu_log, sigma_log^2), then R = exp(X)-1
-    X = np.random.normal(loc=mu_log, scale=sigma_log, size=n_sims)
+    normal = np.random.normal if rng is None else rng.normal
+    X = normal(loc=mu_log, scale=sigma_log, size=n_sims)
     R = np.exp(X) - 1.0
     return R
 
@@ -39,24 +90,84 @@ class RiskyAsset:
     standard_deviation: float
     distribution_type: DistributionType = DistributionType.LOG_NORMAL
 
-    def draw(self, n_draws: int = 1) -> float | np.ndarray:
-        if self.distribution_type == DistributionType.LOG_NORMAL:
-            draws = draw_lognormal_return(
-                self.expected_return,
-                self.standard_deviation,
-                n_sims=n_draws,
-            )
-        elif self.distribution_type == DistributionType.NORMAL:
-            draws = np.random.normal(
-                loc=self.expected_return,
-                scale=self.standard_deviation,
-                size=n_draws,
+    def draw(
+        self,
+        n_draws: int = 1,
+        rng: np.random.Generator | None = None,
+        sampling: SamplingMethod = SamplingMethod.PSEUDO_RANDOM,
+        dtype: npt.DTypeLike = np.float64,
+    ) -> float | np.ndarray:
+        """Draw returns from `rng`, or from the global numpy state if `rng` is None.
+        Other `sampling` methods map uniforms through the inverse normal CDF.
+
+        Shocks are always drawn in float64 and then cast to `dtype`, so a float32 draw
+        rounds the float64 draw from the same `rng` instead of starting a new stream.
+        """
+        if sampling == SamplingMethod.PSEUDO_RANDOM:
+            standard_normal = (
+                np.random.standard_normal if rng is None else rng.standard_normal
             )
-            draws = np.maximum(-1, draws)
+            if n_draws == 1:
+                # The same shock as standard_normal(size=1)[0], without the arrays
+                return self._from_scalar_normal(standard_normal())
+            z = standard_normal(size=n_draws)
+        else:
+            from scipy.special import ndtri
+
+            if rng is None:
+                rng = np.random.default_rng(np.random.randint(2**31))
+            z = ndtri(uniform_sampler(1, rng=rng, sampling=sampling)(n_draws)[:, 0])
+        draws = self.from_standard_normal(z.astype(dtype, copy=False))
         if n_draws == 1:
             return float(draws[0])
         return draws
 
+    def from_standard_normal(self, z: np.ndarray) -> np.ndarray:
+        """Returns corresponding to standard normal shocks `z`. `draw` is this applied to
+        fresh shocks, so passing the same shocks to assets with different parameters
+        gives them common random numbers. The returns have the dtype of `z`."""
+        if self.distribution_type == DistributionType.LOG_NORMAL:
+            mu_log, sigma_log = lognormal_parameters(
+                self.expected_return, self.standard_deviation
+            )
+            # As Python floats, the parameters don't promote float32 shocks to float64
+            return np.exp(float(mu_log) + float(sigma_log) * z) - 1.0
+        elif self.distribution_type == DistributionType.NORMAL:
+            return np.maximum(-1, self.expected_return + self.standard_deviation * z)
+
+    def _from_scalar_normal(self, z: float) -> float:
+        """`from_standard_normal` of one shock, in Python floats"""
+        if self.distribution_type == DistributionType.LOG_NORMAL:
+            mu_log, sigma_log = lognormal_parameters(
+                self.expected_return, self.standard_deviation
+            )
+            # np.exp, not math.exp, so that the draw matches the array path exactly
+            return float(np.exp(mu_log + sigma_log * z)) - 1.0
+        return max(-1.0, self.expected_return + self.standard_deviation * z)
+
+    @property
+    def mean(self) -> float:
+        """Exact expected return, including the floor at -1 for NORMAL returns"""
+        if self.distribution_type == DistributionType.LOG_NORMAL:
+            return self.expected_return
+        # E[max(X, -1)] for X ~ Normal(mu, sigma^2)
+        mu, sigma = self.expected_return, self.standard_deviation
+        if sigma == 0:
+            return max(mu, -1.0)
+        a = (-1 - mu) / sigma
+        phi = math.exp(-(a**2) / 2) / math.sqrt(2 * math.pi)
+        cdf = math.erfc(-a / math.sqrt(2)) / 2
+        return float(-cdf + mu * (1 - cdf) + sigma * phi)
+
+    def quadrature(self, n_nodes: int = 7) -> tuple[np.ndarray, np.ndarray]:
+        """Returns and probabilities of an `n_nodes`-point Gauss-Hermite rule for this
+        distribution, so that `returns @ probabilities` approximates E[f(R)] for smooth f.
+        Nodes go through `from_standard_normal`, as in `draw`."""
+        x, w = np.polynomial.hermite_e.hermegauss(n_nodes)
+        probabilities = w / w.sum()
+        returns = self.from_standard_normal(x)
+        return returns, probabilities
+
 
 def risk_adjusted_excess_return(
     expected_excess_return: float,
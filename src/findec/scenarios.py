@@ -0,0 +1,225 @@
+"""Pre-drawn randomness for the batch engine.
+
+A `ScenarioBank` holds everything random about a set of life paths: the standard normal
+shock behind each year's risky return, and each path's age at death. Simulating
+different configurations against the same bank gives them common random numbers, so
+differences between the configurations are not swamped by sampling noise.
+
+Banks can be written to a directory of `.npy` files once and then memory-mapped, so
+that many jobs and worker processes share one large bank without regenerating it or
+holding it in memory.
+"""
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from findec.returns import SamplingMethod, uniform_sampler
+from findec.survival import mortality_table
+
+RETURN_SHOCKS_FILE = "return_shocks.npy"
+DEATH_AGE_FILE = "death_age.npy"
+METADATA_FILE = "scenarios.json"
+
+
+@dataclass
+class ScenarioBank:
+    """Row i of `return_shocks` holds path i's shocks, with column t driving the risky
+    return in simulated year t. `death_age` is past the horizon for paths that outlive
+    it, as drawn from the mortality table of `is_male` if `with_longevity_uncertainty`.
+    `path` is the directory the bank is memory-mapped from, if any.
+
+    Paths are drawn with `sampling` in blocks of `block_size` (all at once if None). With
+    SOBOL, every block is an independently scrambled sequence.
+    """
+
+    starting_age: int
+    return_shocks: np.ndarray  # (n_paths, n_ages), standard normal
+    death_age: np.ndarray  # (n_paths,)
+    path: Path | None = None
+    sampling: SamplingMethod = SamplingMethod.PSEUDO_RANDOM
+    block_size: int | None = None
+    is_male: bool = False
+    with_longevity_uncertainty: bool = True
+
+    @property
+    def n_paths(self) -> int:
+        return len(self.death_age)
+
+    @property
+    def time_horizon_max(self) -> int:
+        return self.return_shocks.shape[1] - 1
+
+    @classmethod
+    def draw(
+        cls,
+        *,
+        n_paths: int,
+        time_horizon_max: int,
+        rng: np.random.Generator,
+        starting_age: int = 65,
+        is_male: bool = False,
+        with_longevity_uncertainty: bool = True,
+        sampling: SamplingMethod = SamplingMethod.PSEUDO_RANDOM,
+        block_size: int | None = None,
+    ) -> "ScenarioBank":
+        bank = cls(
+            starting_age=starting_age,
+            return_shocks=np.empty((n_paths, time_horizon_max + 1)),
+            death_age=np.empty(n_paths, dtype=np.int64),
+            sampling=sampling,
+            block_size=block_size,
+            is_male=is_male,
+            with_longevity_uncertainty=with_longevity_uncertainty,
+        )
+        bank._fill(rng=rng)
+        return bank
+
+    @classmethod
+    def write(
+        cls,
+        path: str | Path,
+        *,
+        n_paths: int,
+        time_horizon_max: int,
+        rng: np.random.Generator,
+        starting_age: int = 65,
+        is_male: bool = False,
+        with_longevity_uncertainty: bool = True,
+        sampling: SamplingMethod = SamplingMethod.PSEUDO_RANDOM,
+        block_size: int = 1_000_000,
+    ) -> "ScenarioBank":
+        """Draw a bank straight into the directory `path`, `block_size` paths at a time,
+        and return it memory-mapped. Gives the same bank as `draw` with the same
+        arguments (pseudo-random banks don't depend on `block_size`)."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        n_ages = time_horizon_max + 1
+        bank = cls(
+            starting_age=starting_age,
+            return_shocks=np.lib.format.open_memmap(
+                path / RETURN_SHOCKS_FILE, mode="w+", shape=(n_paths, n_ages)
+            ),
+            death_age=np.lib.format.open_memmap(
+                path / DEATH_AGE_FILE, mode="w+", dtype=np.int64, shape=(n_paths,)
+            ),
+            sampling=sampling,
+            block_size=block_size,
+            is_male=is_male,
+            with_longevity_uncertainty=with_longevity_uncertainty,
+        )
+        bank._fill(rng=rng)
+        bank.return_shocks.flush()
+        bank.death_age.flush()
+        metadata = {
+            "starting_age": starting_age,
+            "sampling": sampling.name,
+            "block_size": block_size,
+            "is_male": is_male,
+            "with_longevity_uncertainty": with_longevity_uncertainty,
+        }
+        (path / METADATA_FILE).write_text(json.dumps(metadata))
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str | Path) -> "ScenarioBank":
+        """Memory-map a bank written by `write`. Nothing is read until it is used."""
+        path = Path(path)
+        metadata = json.loads((path / METADATA_FILE).read_text())
+        return cls(
+            starting_age=metadata["starting_age"],
+            return_shocks=np.load(path / RETURN_SHOCKS_FILE, mmap_mode="r"),
+            death_age=np.load(path / DEATH_AGE_FILE, mmap_mode="r"),
+            path=path,
+            sampling=SamplingMethod[metadata["sampling"]],
+            block_size=metadata["block_size"],
+            is_male=metadata["is_male"],
+            with_longevity_uncertainty=metadata["with_longevity_uncertainty"],
+        )
+
+    def check_mortality(self, *, is_male: bool, with_longevity_uncertainty: bool):
+        """Raise if the bank's death ages weren't drawn for these arguments (`is_male`
+        doesn't matter without longevity uncertainty)"""
+        if self.with_longevity_uncertainty != with_longevity_uncertainty or (
+            with_longevity_uncertainty and self.is_male != is_male
+        ):
+            raise ValueError(
+                f"Scenario bank drawn with is_male={self.is_male}, "
+                f"with_longevity_uncertainty={self.with_longevity_uncertainty} can't be "
+                f"simulated with is_male={is_male}, "
+                f"with_longevity_uncertainty={with_longevity_uncertainty}"
+            )
+
+    def _fill(self, *, rng: np.random.Generator):
+        block_size = self.block_size or max(self.n_paths, 1)
+        if self.sampling == SamplingMethod.ANTITHETIC and block_size % 2:
+            raise ValueError("Antithetic pairs need an even block_size")
+        # Separate streams for shocks and lifetimes, so that pseudo-random banks don't
+        # depend on `block_size`
+        shock_rng, death_rng = (
+            np.random.default_rng(seed) for seed in rng.integers(2**63, size=2)
+        )
+        n_ages = self.return_shocks.shape[1]
+        mortality = mortality_table(self.is_male)
+        if self.sampling != SamplingMethod.SOBOL:
+            sampler = uniform_sampler(1, rng=death_rng, sampling=self.sampling)
+        for start in range(0, self.n_paths, block_size):
+            rows = slice(start, min(start + block_size, self.n_paths))
+            n = rows.stop - rows.start
+            if self.sampling == SamplingMethod.PSEUDO_RANDOM:
+                self.return_shocks[rows] = shock_rng.standard_normal(size=(n, n_ages))
+                u_death = sampler(n)[:, 0]
+            elif self.sampling == SamplingMethod.ANTITHETIC:
+                z = shock_rng.standard_normal(size=((n + 1) // 2, n_ages))
+                self.return_shocks[rows.start : rows.stop : 2] = z
+                self.return_shocks[rows.start + 1 : rows.stop : 2] = -z[: n // 2]
+                u_death = sampler(n)[:, 0]
+            else:
+                from scipy.special import ndtri
+
+                # One dimension per year, plus one for the lifetime
+                sobol = uniform_sampler(n_ages + 1, rng=shock_rng, sampling=self.sampling)
+                points = sobol(n)
+                self.return_shocks[rows] = ndtri(points[:, :n_ages])
+                u_death = points[:, n_ages]
+
+            if self.with_longevity_uncertainty:
+                self.death_age[rows] = mortality.death_age_from_uniform(
+                    starting_age=self.starting_age, u=u_death
+                )
+            else:
+                self.death_age[rows] = self.starting_age + n_ages
+
+    def paths(self, start: int, stop: int) -> "ScenarioBank":
+        """The bank restricted to paths start..stop-1. Slices of a memory-mapped bank
+        are still memory-mapped; nothing is copied."""
+        return ScenarioBank(
+            starting_age=self.starting_age,
+            return_shocks=self.return_shocks[start:stop],
+            death_age=self.death_age[start:stop],
+            sampling=self.sampling,
+            block_size=self.block_size,
+            is_male=self.is_male,
+            with_longevity_uncertainty=self.with_longevity_uncertainty,
+        )
+
+    def __reduce__(self):
+        # A memory-mapped bank is sent to other processes as its directory, to be mapped
+        # again there, rather than copied
+        if self.path is not None:
+            return (ScenarioBank.open, (self.path,))
+        return (
+            ScenarioBank,
+            (
+                self.starting_age,
+                self.return_shocks,
+                self.death_age,
+                None,
+                self.sampling,
+                self.block_size,
+                self.is_male,
+                self.with_longevity_uncertainty,
+            ),
+        )
@@ -1,33 +1,543 @@
 import numpy as np
+import numpy.typing as npt
 import polars as pl
 import copy
+import functools
+import inspect
+import multiprocessing
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
 
 from findec.assets import Assets
+from findec.batch import simulate_life_paths_batch
 from findec.utility import crra_utility
-from findec.utility import wealth_to_gamma, bequest_utility
-from findec.policy import policy
-from findec.dataclasses import Preferences, State
-from findec.returns import RiskyAsset, DistributionType
+from findec.utility import bequest_utility
+from findec.policy import PolicyRule, PolicyTable, build_policy_table
+from findec.profiling import active_profiler, stage_timer
+from findec.dataclasses import Preferences, PathRecord, path_records_frame
+from findec.returns import RiskyAsset, DistributionType, SamplingMethod
+from findec.scenarios import ScenarioBank
 from findec.consumption import consume_from_assets
-from findec.survival import (
-    age_to_death_probability_female,
-    age_to_death_probability_male,
-    age_to_life_expectancy_male,
-    age_to_life_expectancy_female,
-)
-from tqdm import tqdm
-
-
-def simulate_life_paths(*args, n_sims: int, **kwargs) -> pl.DataFrame:
-    dfs = []
-    for i in tqdm(range(n_sims)):
-        copied_args = copy.deepcopy(args)
-        copied_kwargs = copy.deepcopy(kwargs)
-        states = simulate_life_path(rng_seed=i, *copied_args, **copied_kwargs)
-        df = pl.DataFrame([s.as_dict() for s in states.values()])
-        df = df.with_columns(pl.lit(i, dtype=pl.Utf8()).alias("run_number"))
-        dfs.append(df)
-    return pl.concat(dfs)
+from findec.summary import LifetimeUtilityEstimator, SimulationSummary, METRICS_DEFAULT
+from findec.survival import mortality_table
+
+
+def simulate_life_paths(
+    *args,
+    n_sims: int,
+    vectorized: bool = False,
+    batch_size: int = 10_000,
+    workers: int | None = None,
+    sink: str | Path | None = None,
+    summary: bool = False,
+    summary_metrics: list[str] | None = None,
+    scenarios: ScenarioBank | str | Path | None = None,
+    sampling: SamplingMethod = SamplingMethod.PSEUDO_RANDOM,
+    compact: bool = False,
+    dtype: npt.DTypeLike = np.float64,
+    progress: bool = True,
+    **kwargs,
+) -> pl.DataFrame | pl.LazyFrame | SimulationSummary:
+    """Simulate `n_sims` independent life paths.
+
+    With `vectorized=True`, paths are moved forward together in batches of `batch_size`
+    by `findec.batch.simulate_life_paths_batch`. This gives the same distributions as
+    the scalar engine, but not the same draws.
+
+    With `workers` set, chunks of paths run in a pool of `workers` processes. Every path
+    (or every vectorized batch) draws from its own `np.random.Generator`, spawned from
+    `np.random.SeedSequence(rng_seed_offset)`, so results do not depend on `workers`.
+    Vectorized runs always use these streams; only the serial scalar engine reseeds the
+    global numpy state per path.
+
+    With `sink` set to a `.parquet` or `.arrow`/`.ipc`/`.feather` path, each chunk of at
+    most `batch_size` paths is written out as soon as it finishes and a lazy scan of the
+    file is returned, so memory does not grow with `n_sims`. A `sink` path without a
+    suffix is a directory of Parquet files partitioned by chunk and age; see
+    `findec.sink.FrameSink`.
+
+    With `compact=True`, frames use `findec.sink.state_schema(compact=True)`: Float32
+    values, UInt8 ages and UInt32 run numbers.
+
+    With `summary=True`, no per-path panel is kept: each chunk is folded into a
+    `findec.summary.SimulationSummary` of per-age quantile sketches and moments of
+    `summary_metrics` (moments only for utilities), which is returned instead. Its
+    `expected_utility()` gives the expected lifetime utility with a standard error that
+    allows for `sampling`, and optionally with control variates.
+
+    With `sampling` set to ANTITHETIC or SOBOL (vectorized only), each batch draws its
+    returns and lifetimes as antithetic pairs or as its own scrambled Sobol' sequence;
+    a power-of-two `batch_size` suits Sobol' sequences best.
+
+    With `scenarios` set to a `findec.scenarios.ScenarioBank`, or the directory of one
+    written with `ScenarioBank.write`, the first `n_sims` paths of the bank are simulated
+    (vectorized only): chunk i reads its slice of return shocks and death ages from the
+    bank instead of drawing them. The bank must have been drawn with the same `is_male`
+    and `with_longevity_uncertainty`. Memory-mapped banks reach workers as their
+    directory and are never copied whole.
+
+    With `dtype=np.float32` (vectorized only), the batch engine works in single
+    precision; see `findec.batch.simulate_life_paths_batch`, and `findec.precision` for
+    when that is accurate enough.
+
+    Inside `findec.profiling.profile_stages()`, the time spent in each stage of every
+    simulated year is accumulated (serial runs only).
+
+    `progress=False` hides the progress bar.
+    """
+    _check_dtype(dtype, vectorized=vectorized)
+    scenarios, sampling, replicate_size = _randomness_for(
+        n_sims=n_sims,
+        vectorized=vectorized,
+        batch_size=batch_size,
+        scenarios=scenarios,
+        sampling=sampling,
+    )
+    if summary:
+        summary_metrics = list(summary_metrics or METRICS_DEFAULT)
+    _check_mortality(scenarios, kwargs)
+    if "policy_table" not in kwargs:
+        kwargs["policy_table"] = _policy_table_for(kwargs)
+
+    frames = _iter_life_path_chunks(
+        *args,
+        n_sims=n_sims,
+        vectorized=vectorized,
+        batch_size=batch_size,
+        workers=workers,
+        summary_metrics=summary_metrics if summary else None,
+        scenarios=scenarios,
+        sampling=sampling,
+        replicate_size=replicate_size,
+        dtype=dtype,
+        progress=progress,
+        **kwargs,
+    )
+    if summary:
+        result = _empty_summary(
+            summary_metrics, kwargs, sampling=sampling, replicate_size=replicate_size
+        )
+        for part in frames:
+            if isinstance(part, SimulationSummary):
+                result.merge(part)
+            else:
+                result.update_frame(part)
+        return result
+
+    if sink is None:
+        if compact:
+            from findec.sink import conform, state_schema
+
+            schema = state_schema(compact=True)
+            frames = (conform(df, schema) for df in frames)
+        return pl.concat(frames)
+
+    from findec.sink import FrameSink, state_schema
+
+    with FrameSink(sink, schema=state_schema(compact=compact)) as frame_sink:
+        for df in frames:
+            frame_sink.write(df)
+    return frame_sink.scan()
+
+
+def _check_dtype(dtype: npt.DTypeLike, *, vectorized: bool):
+    if np.dtype(dtype) not in (np.float32, np.float64):
+        raise ValueError(f"dtype must be float32 or float64, not {np.dtype(dtype)}")
+    if np.dtype(dtype) != np.float64 and not vectorized:
+        raise ValueError("Reduced precision needs vectorized=True")
+
+
+def _randomness_for(
+    *,
+    n_sims: int,
+    vectorized: bool,
+    batch_size: int,
+    scenarios: ScenarioBank | str | Path | None,
+    sampling: SamplingMethod,
+) -> tuple[ScenarioBank | None, SamplingMethod, int | None]:
+    """Checks the randomness options of `simulate_life_paths`. Returns the (opened)
+    bank, the sampling method and the number of paths per Sobol' replicate."""
+    if scenarios is not None:
+        if not vectorized:
+            raise ValueError("Simulating from a scenario bank needs vectorized=True")
+        if not isinstance(scenarios, ScenarioBank):
+            scenarios = ScenarioBank.open(scenarios)
+        if n_sims > scenarios.n_paths:
+            raise ValueError(
+                f"n_sims={n_sims} is more than the {scenarios.n_paths} paths in the bank"
+            )
+        if sampling != SamplingMethod.PSEUDO_RANDOM:
+            raise ValueError("A scenario bank's sampling is set when it is drawn")
+        return scenarios, scenarios.sampling, scenarios.block_size
+    if sampling != SamplingMethod.PSEUDO_RANDOM and not vectorized:
+        raise ValueError(f"{sampling.name} sampling needs vectorized=True")
+    if sampling == SamplingMethod.ANTITHETIC and (batch_size % 2 or n_sims % 2):
+        raise ValueError("Antithetic sampling needs an even n_sims and batch_size")
+    return None, sampling, batch_size
+
+
+@dataclass
+class AdaptiveResult:
+    """Outcome of `simulate_until`. `stop_reason` is "tolerance", "time_budget" or
+    "max_sims"."""
+
+    summary: SimulationSummary
+    target: str
+    estimate: float
+    standard_error: float
+    elapsed: float
+    stop_reason: str
+
+    @property
+    def n_sims(self) -> int:
+        return self.summary.n_paths
+
+    @property
+    def relative_error(self) -> float:
+        return self.standard_error / abs(self.estimate)
+
+
+def simulate_until(
+    *args,
+    atol: float | None = None,
+    rtol: float | None = None,
+    time_budget: float | None = None,
+    max_sims: int = 10_000_000,
+    target: str = "expected_utility",
+    control_variates: bool = False,
+    batch_size: int = 10_000,
+    vectorized: bool = True,
+    workers: int | None = None,
+    summary_metrics: list[str] | None = None,
+    scenarios: ScenarioBank | str | Path | None = None,
+    sampling: SamplingMethod = SamplingMethod.PSEUDO_RANDOM,
+    dtype: npt.DTypeLike = np.float64,
+    progress: bool = True,
+    **kwargs,
+) -> AdaptiveResult:
+    """Simulate batches of `batch_size` paths, as `simulate_life_paths(summary=True)`
+    does, until the standard error of `target` is at most `atol`, or at most `rtol`
+    times the estimate in absolute value, or `time_budget` seconds have passed, or
+    `max_sims` paths (at most the whole bank, with `scenarios`) have been simulated.
+
+    `target` is "expected_utility" (optionally with `control_variates`) or
+    "certainty_equivalent", the consumption certainty equivalent. The tolerance is
+    checked after every batch from the second on, so there are always at least two
+    (with SOBOL sampling, the standard error needs at least two replicates).
+
+    Run order and seeding are those of `simulate_life_paths`, so the paths simulated are
+    the first `n_sims` of the ones it would simulate with the same arguments.
+    `progress=False` hides the progress bar.
+    """
+    if target not in ("expected_utility", "certainty_equivalent"):
+        raise ValueError(f"Unknown target {target!r}")
+    if atol is None and rtol is None and time_budget is None:
+        raise ValueError("At least one of atol, rtol and time_budget must be given")
+    _check_dtype(dtype, vectorized=vectorized)
+    if scenarios is not None:
+        if not isinstance(scenarios, ScenarioBank):
+            scenarios = ScenarioBank.open(scenarios)
+        max_sims = min(max_sims, scenarios.n_paths)
+    scenarios, sampling, replicate_size = _randomness_for(
+        n_sims=max_sims,
+        vectorized=vectorized,
+        batch_size=batch_size,
+        scenarios=scenarios,
+        sampling=sampling,
+    )
+    summary_metrics = list(summary_metrics or METRICS_DEFAULT)
+    _check_mortality(scenarios, kwargs)
+    if "policy_table" not in kwargs:
+        kwargs["policy_table"] = _policy_table_for(kwargs)
+
+    def precision() -> tuple[float, float]:
+        if target == "certainty_equivalent":
+            return result.certainty_equivalent()
+        return result.expected_utility(control_variates=control_variates)
+
+    start_time = time.perf_counter()
+    result = _empty_summary(
+        summary_metrics, kwargs, sampling=sampling, replicate_size=replicate_size
+    )
+    parts = _iter_life_path_chunks(
+        *args,
+        n_sims=max_sims,
+        vectorized=vectorized,
+        batch_size=batch_size,
+        workers=workers,
+        summary_metrics=summary_metrics,
+        scenarios=scenarios,
+        sampling=sampling,
+        replicate_size=replicate_size,
+        dtype=dtype,
+        progress=progress,
+        **kwargs,
+    )
+    stop_reason = "max_sims"
+    try:
+        for i, part in enumerate(parts):
+            if isinstance(part, SimulationSummary):
+                result.merge(part)
+            else:
+                result.update_frame(part)
+            estimate, standard_error = precision()
+            if i >= 1 and (
+                (atol is not None and standard_error <= atol)
+                or (rtol is not None and standard_error <= rtol * abs(estimate))
+            ):
+                stop_reason = "tolerance"
+                break
+            if time_budget is not None and time.perf_counter() - start_time >= time_budget:
+                stop_reason = "time_budget"
+                break
+    finally:
+        # Cancels the chunks still queued in a worker pool
+        parts.close()
+
+    estimate, standard_error = precision()
+    return AdaptiveResult(
+        summary=result,
+        target=target,
+        estimate=estimate,
+        standard_error=standard_error,
+        elapsed=time.perf_counter() - start_time,
+        stop_reason=stop_reason,
+    )
+
+
+def _iter_life_path_chunks(
+    *args,
+    n_sims: int,
+    vectorized: bool,
+    batch_size: int,
+    workers: int | None,
+    summary_metrics: list[str] | None,
+    scenarios: ScenarioBank | None = None,
+    sampling: SamplingMethod = SamplingMethod.PSEUDO_RANDOM,
+    replicate_size: int | None = None,
+    dtype: npt.DTypeLike = np.float64,
+    progress: bool = True,
+    **kwargs,
+) -> Iterator[pl.DataFrame | SimulationSummary]:
+    """Yields one frame per chunk of paths, in run order. Chunks run through
+    `_simulate_chunk` are summarised there if `summary_metrics` is given."""
+    from tqdm import tqdm
+
+    if not vectorized and workers is None:
+        stage = stage_timer()
+        records = []
+        for i in tqdm(range(n_sims), disable=not progress):
+            copied_args, copied_kwargs = _path_arguments(args, kwargs)
+            records.append(simulate_life_path(rng_seed=i, *copied_args, **copied_kwargs))
+            if len(records) == batch_size or i == n_sims - 1:
+                with stage("frame"):
+                    frame = path_records_frame(records, range(i + 1 - len(records), i + 1))
+                yield frame
+                records = []
+        return
+
+    rng_seed_offset = kwargs.pop("rng_seed_offset", None)
+    entropy = np.random.SeedSequence(rng_seed_offset).entropy
+    workers = 1 if workers is None else workers
+    if not vectorized:
+        batch_size = min(batch_size, max(1, n_sims // (4 * workers)))
+
+    chunks = [
+        (start, min(start + batch_size, n_sims))
+        for start in range(0, n_sims, batch_size)
+    ]
+    simulate_chunk = functools.partial(
+        _simulate_chunk,
+        entropy=entropy,
+        vectorized=vectorized,
+        summary_metrics=summary_metrics,
+        scenarios=scenarios,
+        sampling=sampling,
+        replicate_size=replicate_size,
+        dtype=dtype,
+        args=args,
+        kwargs=kwargs,
+    )
+
+    if workers == 1:
+        for chunk in tqdm(chunks, disable=not progress):
+            yield simulate_chunk(chunk)
+        return
+    if active_profiler() is not None:
+        raise ValueError("Stage profiling is in-process only; it can't use workers")
+
+    # polars' thread pool does not survive fork(), so workers are spawned
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        # Keep a bounded number of chunks in flight so finished frames don't pile up
+        pending: deque[Future] = deque()
+        try:
+            for chunk in tqdm(chunks, disable=not progress):
+                pending.append(executor.submit(simulate_chunk, chunk))
+                if len(pending) > 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # If the consumer stops early, don't wait for chunks nobody will read
+            for future in pending:
+                future.cancel()
+
+
+def path_rng(entropy: int, key: int) -> np.random.Generator:
+    """The independent stream for path (or vectorized batch) `key`, equivalent to
+    `np.random.SeedSequence(entropy).spawn(key + 1)[key]`"""
+    return np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(key,)))
+
+
+def _simulate_chunk(
+    chunk: tuple[int, int],
+    *,
+    entropy: int,
+    vectorized: bool,
+    summary_metrics: list[str] | None,
+    args: tuple,
+    kwargs: dict,
+    scenarios: ScenarioBank | None = None,
+    sampling: SamplingMethod = SamplingMethod.PSEUDO_RANDOM,
+    replicate_size: int | None = None,
+    dtype: npt.DTypeLike = np.float64,
+) -> pl.DataFrame | SimulationSummary:
+    start, stop = chunk
+    stage = stage_timer()
+    if vectorized:
+        if scenarios is not None:
+            randomness = {"scenarios": scenarios.paths(start, stop)}
+        elif sampling == SamplingMethod.PSEUDO_RANDOM:
+            randomness = {"rng": path_rng(entropy, start)}
+        else:
+            arguments = _simulation_arguments(kwargs)
+            randomness = {
+                "scenarios": ScenarioBank.draw(
+                    n_paths=stop - start,
+                    time_horizon_max=arguments["time_horizon_max"],
+                    rng=path_rng(entropy, start),
+                    starting_age=arguments["starting_age"],
+                    is_male=arguments["is_male"],
+                    with_longevity_uncertainty=arguments["with_longevity_uncertainty"],
+                    sampling=sampling,
+                )
+            }
+        batch = simulate_life_paths_batch(
+            n_paths=stop - start,
+            run_offset=start,
+            dtype=dtype,
+            **randomness,
+            **kwargs,
+        )
+        if summary_metrics is not None:
+            with stage("summary"):
+                summary = _empty_summary(
+                    summary_metrics, kwargs, sampling=sampling, replicate_size=replicate_size
+                )
+                summary.update_batch(batch)
+            return summary
+        with stage("frame"):
+            return batch.to_frame()
+
+    records = []
+    for i in range(start, stop):
+        copied_args, copied_kwargs = _path_arguments(args, kwargs)
+        records.append(
+            simulate_life_path(*copied_args, rng=path_rng(entropy, i), **copied_kwargs)
+        )
+    with stage("frame"):
+        df = path_records_frame(records, range(start, stop))
+    if summary_metrics is not None:
+        summary = _empty_summary(
+            summary_metrics, kwargs, sampling=sampling, replicate_size=replicate_size
+        )
+        summary.update_frame(df)
+        return summary
+    return df
+
+
+def _path_arguments(args: tuple, kwargs: dict) -> tuple[tuple, dict]:
+    """Fresh copies of the arguments for one path, since `simulate_life_path` spends its
+    `assets`. The policy table is only read, so every path shares the one built for the
+    run."""
+    policy_table = kwargs.get("policy_table")
+    # A pre-filled memo makes deepcopy reuse the table instead of copying it
+    return copy.deepcopy((args, kwargs), memo={id(policy_table): policy_table})
+
+
+def _simulation_arguments(kwargs: dict) -> dict:
+    """`kwargs` for `simulate_life_path`, with its defaults filled in"""
+    bound = inspect.signature(simulate_life_path).bind_partial(**kwargs)
+    bound.apply_defaults()
+    return bound.arguments
+
+
+def _check_mortality(scenarios: ScenarioBank | None, kwargs: dict):
+    """Fail before any chunk runs if the bank's lifetimes don't match `kwargs`"""
+    if scenarios is not None:
+        arguments = _simulation_arguments(kwargs)
+        scenarios.check_mortality(
+            is_male=arguments["is_male"],
+            with_longevity_uncertainty=arguments["with_longevity_uncertainty"],
+        )
+
+
+def _policy_table_for(kwargs: dict) -> PolicyTable:
+    arguments = _simulation_arguments(kwargs)
+    return build_policy_table(
+        pref=arguments["pref"],
+        risk_free_rate=arguments["risk_free_rate"],
+        risky_asset=RiskyAsset(
+            expected_return=arguments["expected_return_risky"],
+            standard_deviation=arguments["std_dev_return_risky"],
+        ),
+        inflation_rate=arguments["assets"].inflation_rate,
+        starting_age=arguments["starting_age"],
+        time_horizon_max=arguments["time_horizon_max"],
+        with_longevity_uncertainty=arguments["with_longevity_uncertainty"],
+        is_male=arguments["is_male"],
+    )
+
+
+def _empty_summary(
+    metrics: list[str],
+    kwargs: dict,
+    *,
+    sampling: SamplingMethod,
+    replicate_size: int | None,
+) -> SimulationSummary:
+    arguments = _simulation_arguments(kwargs)
+    starting_age = arguments["starting_age"]
+    time_horizon_max = arguments["time_horizon_max"]
+    if arguments["with_longevity_uncertainty"]:
+        expected_years = mortality_table(arguments["is_male"]).expected_years_alive(
+            starting_age=starting_age, n_years=time_horizon_max
+        )
+    else:
+        expected_years = time_horizon_max
+    ra = RiskyAsset(
+        expected_return=arguments["expected_return_risky"],
+        standard_deviation=arguments["std_dev_return_risky"],
+        distribution_type=arguments["returns_distribution_type"],
+    )
+    return SimulationSummary(
+        ages=np.arange(starting_age, starting_age + time_horizon_max + 1),
+        metrics=metrics,
+        estimator=LifetimeUtilityEstimator(
+            expected_return=ra.mean,
+            expected_years=expected_years,
+            gamma=arguments["pref"].gamma_above_subsistence,
+            rate_time_preference=arguments["pref"].rate_time_preference,
+            sampling=sampling,
+            replicate_size=replicate_size,
+        ),
+    )
 
 
 def simulate_life_path(
@@ -42,123 +552,147 @@ def simulate_life_path(
     time_horizon_max: int,  # maximum number of years we will live from current age. Can set this to very large numbers.
     rng_seed: int | None = None,
     rng_seed_offset: int | None = None,
+    rng: np.random.Generator | None = None,
     starting_age: int = 65,
     is_male: bool = False,
     with_longevity_uncertainty: bool = True,
     returns_distribution_type: DistributionType = DistributionType.NORMAL,
-) -> dict[int, State]:
-    if rng_seed_offset is not None and rng_seed is not None:
+    policy_table: PolicyTable | None = None,
+    policy_rule: PolicyRule | None = None,
+) -> PathRecord:
+    """Simulate one life path. Draws come from `rng` if given; otherwise the global numpy
+    state is seeded with `rng_seed_offset + rng_seed`.
+
+    `policy_table` must match the other arguments; it is built here if not given. The
+    closed-form Merton policy it holds is followed unless another `policy_rule`, such as
+    a `findec.policy.GridPolicy`, is given.
+    """
+    if rng is None and rng_seed_offset is not None and rng_seed is not None:
         np.random.seed(rng_seed_offset + rng_seed)
+    stage = stage_timer()
 
-    if is_male:
-        age_to_death_probability = age_to_death_probability_male
-        age_to_life_expectancy = age_to_life_expectancy_male
-    else:
-        age_to_death_probability = age_to_death_probability_female
-        age_to_life_expectancy = age_to_life_expectancy_female
+    # Lifetime is drawn up front; None means we live to the end of the horizon
+    death_age = None
+    if with_longevity_uncertainty:
+        with stage("mortality"):
+            death_age = int(
+                mortality_table(is_male).sample_death_age(
+                    starting_age=starting_age, n=1, rng=rng
+                )[0]
+            )
 
     ra = RiskyAsset(
         expected_return=expected_return_risky,
         standard_deviation=std_dev_return_risky,
         distribution_type=returns_distribution_type,
     )
+    if policy_table is None:
+        with stage("policy_table"):
+            policy_table = build_policy_table(
+                pref=pref,
+                risk_free_rate=risk_free_rate,
+                risky_asset=ra,
+                inflation_rate=assets.inflation_rate,
+                starting_age=starting_age,
+                time_horizon_max=time_horizon_max,
+                with_longevity_uncertainty=with_longevity_uncertainty,
+                is_male=is_male,
+            )
+    # Plain floats: numpy scalars are slow one path-year at a time
+    table = policy_table.to_lists()
+    if policy_rule is None:
+        policy_rule = table
 
     total_utility = 0.0
     total_consumption = 0.0
     alive = True
-    states = {
-        starting_age: State(
-            tax_free=assets.tax_free,
-            taxable=assets.taxable,
-            taxable_basis=assets.taxable_basis,
-            portfolio_value_post_inflation=assets.total_wealth_inflation_adjusted(0),
-            total_utility=total_utility,
-            total_consumption=total_consumption,
-            alive=alive,
-            age=starting_age,
-            desired_consumption_pre_tax=None,
-            actual_consumption_post_tax=None,
-            consumption_fraction=None,
-            consumption_post_tax_post_inflation=None,
-            risky_return=None,
-            annual_utility=None,
-            bequest_post_inflation=None,
-        )
-    }
+    states = PathRecord(starting_age=starting_age, time_horizon_max=time_horizon_max)
+    states.append(
+        tax_free=assets.tax_free,
+        taxable=assets.taxable,
+        taxable_basis=assets.taxable_basis,
+        portfolio_value_post_inflation=assets.total_wealth_inflation_adjusted(0),
+        total_utility=total_utility,
+        total_consumption=total_consumption,
+        alive=alive,
+        age=starting_age,
+        desired_consumption_pre_tax=None,
+        actual_consumption_post_tax=None,
+        consumption_fraction=None,
+        consumption_post_tax_post_inflation=None,
+        risky_return=None,
+        annual_utility=None,
+        bequest_post_inflation=None,
+    )
 
     for t in range(1, time_horizon_max + 1):
         age = starting_age + t
-        gamma = wealth_to_gamma(
-            assets.total_wealth_inflation_adjusted(t),
-            subsistence=pref.subsistence,
-            gamma_below_subsistence=pref.gamma_below_subsistence,
-            gamma_above_subsistence=pref.gamma_above_subsistence,
-        )
+        with stage("regime"):
+            regime = table.regime(assets.total_wealth_inflation_adjusted(t))
+            gamma = table.gamma[regime]
 
-        if (
-            with_longevity_uncertainty
-            and np.random.rand() < age_to_death_probability[age]
-        ):  # He's dead, Jim.
+        if age == death_age:  # He's dead, Jim.
             alive = False
-            bu = bequest_utility(
-                assets.total_wealth_inflation_adjusted(t), b=pref.bequest_param, gamma=gamma
-            ) / ((1 + pref.rate_time_preference) ** t)
+            with stage("utility"):
+                bu = bequest_utility(
+                    assets.total_wealth_inflation_adjusted(t),
+                    b=pref.bequest_param,
+                    gamma=gamma,
+                ) / table.utility_discount[t]
             total_utility += bu
-            states[age] = State(
-                tax_free=assets.tax_free,
-                taxable=assets.taxable,
-                taxable_basis=assets.taxable_basis,
-                total_utility=total_utility,
-                total_consumption=total_consumption,
-                alive=alive,
-                age=age,
-                desired_consumption_pre_tax=None,
-                actual_consumption_post_tax=None,
-                consumption_post_tax_post_inflation=None,
-                consumption_fraction=None,
-                portfolio_value_post_inflation=assets.total_wealth_inflation_adjusted(t),
-                risky_return=None,
-                annual_utility=bu,
-                bequest_post_inflation=assets.total_wealth_inflation_adjusted(t),
-            )
+            with stage("record"):
+                states.append(
+                    tax_free=assets.tax_free,
+                    taxable=assets.taxable,
+                    taxable_basis=assets.taxable_basis,
+                    total_utility=total_utility,
+                    total_consumption=total_consumption,
+                    alive=alive,
+                    age=age,
+                    desired_consumption_pre_tax=None,
+                    actual_consumption_post_tax=None,
+                    consumption_post_tax_post_inflation=None,
+                    consumption_fraction=None,
+                    portfolio_value_post_inflation=assets.total_wealth_inflation_adjusted(t),
+                    risky_return=None,
+                    annual_utility=bu,
+                    bequest_post_inflation=assets.total_wealth_inflation_adjusted(t),
+                )
             break
 
         # 1) Income from social security. Let's assume it has to go into the taxable account.
         assets.invest_in_taxable(social_security)
 
-        time_horizon = (
-            age_to_life_expectancy[age]
-            if with_longevity_uncertainty
-            else time_horizon_max - t + 1
-        )
-
-        # 2) Decide policy
-        pol = policy(
-            time_horizon=time_horizon,
-            bequest_param=pref.bequest_param,
-            gamma=gamma,
-            pref=pref,
-            risk_free_rate=risk_free_rate,
-            risky_asset=ra,
-        )
+        # 2) Look up policy
+        with stage("policy"):
+            consumption_fraction, risky_asset_fraction = policy_rule.fractions(
+                t, regime, assets.total_wealth_inflation_adjusted(t)
+            )
+            consumption_fraction = float(consumption_fraction)
+            risky_asset_fraction = float(risky_asset_fraction)
 
         # 3) Grow assets
-        risky_returns = float(ra.draw())
-        assets.grow(
-            risk_free_rate=risk_free_rate,
-            risky_returns=risky_returns,
-            risky_asset_fraction=pol.risky_asset_fraction,
-        )
+        with stage("returns"):
+            risky_returns = ra.draw(rng=rng)
+        with stage("grow"):
+            assets.grow(
+                risk_free_rate=risk_free_rate,
+                risky_returns=risky_returns,
+                risky_asset_fraction=risky_asset_fraction,
+            )
 
         # 4) Use policy to decide how much to consume
         desired_consumption_from_portfolio_pre_tax = (
-            pol.consumption_fraction * assets.total_wealth
+            consumption_fraction * assets.total_wealth
         )
 
         # 5) Consume from assets
-        actual_consumption_from_portfolio_post_tax = consume_from_assets(
-            fractional_consumption=pol.consumption_fraction, assets=assets, tax_rate=tax_rate
-        )
+        with stage("consume"):
+            actual_consumption_from_portfolio_post_tax = consume_from_assets(
+                fractional_consumption=consumption_fraction,
+                assets=assets,
+                tax_rate=tax_rate,
+            )
 
         actual_consumption_from_portfolio_post_tax_post_inflation = (
             actual_consumption_from_portfolio_post_tax * assets.inflation_discount_factor(t)
@@ -166,58 +700,62 @@ def simulate_life_path(
         total_consumption += actual_consumption_from_portfolio_post_tax_post_inflation
 
         # 4) Compute immediate utility from consumption
-        utility_of_consumption = crra_utility(
-            actual_consumption_from_portfolio_post_tax_post_inflation, gamma=gamma
-        )
+        with stage("utility"):
+            utility_of_consumption = crra_utility(
+                actual_consumption_from_portfolio_post_tax_post_inflation, gamma=gamma
+            )
 
-        discounted_utility_of_consumption = utility_of_consumption / (
-            (1 + pref.rate_time_preference) ** t
+        discounted_utility_of_consumption = (
+            utility_of_consumption / table.utility_discount[t]
         )
         total_utility += discounted_utility_of_consumption
 
         # 5) Store state
-        states[age] = State(
-            tax_free=assets.tax_free,
-            taxable=assets.taxable,
-            taxable_basis=assets.taxable_basis,
-            portfolio_value_post_inflation=assets.total_wealth_inflation_adjusted(t),
-            total_utility=total_utility,
-            total_consumption=total_consumption,
-            alive=alive,
-            age=age,
-            desired_consumption_pre_tax=desired_consumption_from_portfolio_pre_tax,
-            actual_consumption_post_tax=actual_consumption_from_portfolio_post_tax,
-            consumption_post_tax_post_inflation=actual_consumption_from_portfolio_post_tax_post_inflation,
-            consumption_fraction=pol.consumption_fraction,
-            risky_return=risky_returns,
-            annual_utility=discounted_utility_of_consumption,
-            bequest_post_inflation=None,
-        )
+        with stage("record"):
+            states.append(
+                tax_free=assets.tax_free,
+                taxable=assets.taxable,
+                taxable_basis=assets.taxable_basis,
+                portfolio_value_post_inflation=assets.total_wealth_inflation_adjusted(t),
+                total_utility=total_utility,
+                total_consumption=total_consumption,
+                alive=alive,
+                age=age,
+                desired_consumption_pre_tax=desired_consumption_from_portfolio_pre_tax,
+                actual_consumption_post_tax=actual_consumption_from_portfolio_post_tax,
+                consumption_post_tax_post_inflation=actual_consumption_from_portfolio_post_tax_post_inflation,
+                consumption_fraction=consumption_fraction,
+                risky_return=risky_returns,
+                annual_utility=discounted_utility_of_consumption,
+                bequest_post_inflation=None,
+            )
         # End of year. Next loop.
 
     if alive:
         # final bequest
-        bu = bequest_utility(
-            assets.total_wealth_inflation_adjusted(t), b=pref.bequest_param, gamma=gamma
-        ) / ((1 + pref.rate_time_preference) ** t)
+        with stage("utility"):
+            bu = bequest_utility(
+                assets.total_wealth_inflation_adjusted(t), b=pref.bequest_param, gamma=gamma
+            ) / table.utility_discount[t]
         total_utility += bu
 
-        states[age] = State(
-            tax_free=assets.tax_free,
-            taxable=assets.taxable,
-            taxable_basis=assets.taxable_basis,
-            portfolio_value_post_inflation=assets.total_wealth_inflation_adjusted(t),
-            total_utility=total_utility,
-            total_consumption=total_consumption,
-            alive=alive,
-            age=age,
-            desired_consumption_pre_tax=desired_consumption_from_portfolio_pre_tax,
-            actual_consumption_post_tax=actual_consumption_from_portfolio_post_tax,
-            consumption_post_tax_post_inflation=actual_consumption_from_portfolio_post_tax_post_inflation,
-            consumption_fraction=pol.consumption_fraction,
-            risky_return=risky_returns,
-            annual_utility=bu + discounted_utility_of_consumption,
-            bequest_post_inflation=assets.total_wealth_inflation_adjusted(t),
-        )
+        with stage("record"):
+            states.replace_last(
+                tax_free=assets.tax_free,
+                taxable=assets.taxable,
+                taxable_basis=assets.taxable_basis,
+                portfolio_value_post_inflation=assets.total_wealth_inflation_adjusted(t),
+                total_utility=total_utility,
+                total_consumption=total_consumption,
+                alive=alive,
+                age=age,
+                desired_consumption_pre_tax=desired_consumption_from_portfolio_pre_tax,
+                actual_consumption_post_tax=actual_consumption_from_portfolio_post_tax,
+                consumption_post_tax_post_inflation=actual_consumption_from_portfolio_post_tax_post_inflation,
+                consumption_fraction=consumption_fraction,
+                risky_return=risky_returns,
+                annual_utility=bu + discounted_utility_of_consumption,
+                bequest_post_inflation=assets.total_wealth_inflation_adjusted(t),
+            )
 
     return states
@@ -0,0 +1,119 @@
+"""Streaming on-disk output for simulation results.
+
+Frames go to a single Parquet or Arrow IPC file, or, for a path without a suffix, to a
+directory of Parquet files partitioned by run batch (one per frame written) and age, so
+that analyses of some ages or some runs only read those files.
+"""
+
+from dataclasses import fields
+from pathlib import Path
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+from findec.dataclasses import State
+
+PARQUET_SUFFIXES = {".parquet"}
+IPC_SUFFIXES = {".arrow", ".ipc", ".feather"}
+
+
+PARTITION_COLUMNS = ["run_batch", "age"]
+
+
+def state_schema(compact: bool = False) -> pl.Schema:
+    """Schema of the frames produced by `simulate_life_paths`. With `compact`, floats are
+    Float32, ages UInt8 and run numbers UInt32, instead of Float64 and Int64."""
+    dtypes: dict[str, pl.DataType] = {}
+    for f in fields(State):
+        if f.type is int:
+            dtypes[f.name] = pl.UInt8() if compact else pl.Int64()
+        elif f.type is bool:
+            dtypes[f.name] = pl.Boolean()
+        else:
+            dtypes[f.name] = pl.Float32() if compact else pl.Float64()
+    dtypes["run_number"] = pl.UInt32() if compact else pl.Int64()
+    return pl.Schema(dtypes)
+
+
+def conform(df: pl.DataFrame, schema: pl.Schema) -> pl.DataFrame:
+    """`df`'s columns in the order and dtypes of `schema`"""
+    return df.select(schema.names()).cast(schema)
+
+
+class FrameSink:
+    """Appends frames to a Parquet (one row group per frame) or Arrow IPC file as they
+    arrive, so only one frame is held in memory at a time. A `path` without a suffix is
+    a directory (new or empty) of Parquet files partitioned as
+    `run_batch=<frame index>/age=<age>/`; scanning it adds a `run_batch` column, and
+    filters on it or on age only read the matching files.
+
+    Use as a context manager; the output is only valid once the sink is closed.
+    """
+
+    def __init__(self, path: str | Path, schema: pl.Schema | None = None):
+        self.path = Path(path)
+        if self.path.suffix not in PARQUET_SUFFIXES | IPC_SUFFIXES | {""}:
+            raise ValueError(
+                f"Unknown sink format {self.path.suffix!r}; use a directory or one of "
+                f"{sorted(PARQUET_SUFFIXES | IPC_SUFFIXES)}"
+            )
+        self.schema = state_schema() if schema is None else schema
+        self._writer: pq.ParquetWriter | pa.ipc.RecordBatchFileWriter | None = None
+        self._n_written = 0
+
+    @property
+    def is_parquet(self) -> bool:
+        return self.path.suffix in PARQUET_SUFFIXES
+
+    @property
+    def is_partitioned(self) -> bool:
+        return self.path.suffix == ""
+
+    def __enter__(self) -> "FrameSink":
+        arrow_schema = pl.DataFrame(schema=self.schema).to_arrow().schema
+        if self.is_partitioned:
+            self.path.mkdir(parents=True, exist_ok=True)
+            if any(self.path.iterdir()):
+                raise ValueError(f"Partitioned sink directory {self.path} is not empty")
+        elif self.is_parquet:
+            self._writer = pq.ParquetWriter(self.path, arrow_schema)
+        else:
+            self._writer = pa.ipc.new_file(self.path, arrow_schema)
+        self._n_written = 0
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def write(self, df: pl.DataFrame):
+        if self._writer is None and not self.is_partitioned:
+            raise RuntimeError("FrameSink must be opened with `with` before writing")
+        df = conform(df, self.schema)
+        if self.is_partitioned:
+            table = df.with_columns(
+                pl.lit(self._n_written, dtype=pl.UInt32).alias("run_batch")
+            ).to_arrow()
+            pq.write_to_dataset(
+                table,
+                root_path=self.path,
+                partition_cols=PARTITION_COLUMNS,
+                basename_template=f"part-{self._n_written}-{{i}}.parquet",
+            )
+        else:
+            self._writer.write_table(df.to_arrow())
+        self._n_written += 1
+
+    def scan(self) -> pl.LazyFrame:
+        if self.is_partitioned:
+            return pl.scan_parquet(
+                self.path / "**" / "*.parquet",
+                hive_partitioning=True,
+                hive_schema={"run_batch": pl.UInt32(), "age": self.schema["age"]},
+            ).select(*self.schema.names(), "run_batch")
+        if self.is_parquet:
+            return pl.scan_parquet(self.path)
+        return pl.scan_ipc(self.path)
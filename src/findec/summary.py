@@ -0,0 +1,453 @@
+"""Constant-memory summaries of simulated life paths.
+
+Per-age quantiles are tracked with a fixed-bin, log-spaced quantile sketch (in the style
+of DDSketch): every value is counted in a bin whose width is a fixed fraction of its
+magnitude, so quantiles have bounded relative error and two sketches merge by adding
+their counts. That suits wealth, consumption and fractions, but not utilities: CRRA
+utilities of different paths cluster just below the asymptote 1 / (gamma - 1) (or near
+`UTILITY_FLOOR`), so a bin of relative width 1% holds all of them. Utility metrics only
+get moments. Means and variances are tracked with Welford/Chan updates.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import polars as pl
+
+from findec.batch import StateBatch
+from findec.returns import SamplingMethod
+from findec.utility import certainty_equivalent_return, crra_utility
+
+METRICS_DEFAULT = [
+    "portfolio_value_post_inflation",
+    "consumption_post_tax_post_inflation",
+    "consumption_fraction",
+    "annual_utility",
+    "total_utility",
+]
+
+# Tracked by moments only; see above
+UTILITY_METRICS = {"annual_utility", "total_utility"}
+
+
+@dataclass
+class LogBins:
+    """Monotone mapping from values to a fixed set of log-spaced bins, symmetric around
+    a single bin for |x| < min_value."""
+
+    relative_accuracy: float = 0.01
+    min_value: float = 1e-6
+    max_value: float = 1e12
+
+    def __post_init__(self):
+        self.gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.key_min = int(np.ceil(np.log(self.min_value) / self.log_gamma))
+        self.key_max = int(np.ceil(np.log(self.max_value) / self.log_gamma))
+        self.n_keys = self.key_max - self.key_min + 1
+        self.zero_bin = self.n_keys
+
+    @property
+    def n_bins(self) -> int:
+        return 2 * self.n_keys + 1
+
+    def index(self, x: np.ndarray) -> np.ndarray:
+        magnitude = np.abs(x)
+        with np.errstate(divide="ignore"):
+            keys = np.ceil(np.log(magnitude) / self.log_gamma)
+        offset = np.clip(keys, self.key_min, self.key_max) - self.key_min + 1
+        offset = np.where(magnitude < self.min_value, 0, offset).astype(np.int64)
+        return self.zero_bin + np.sign(x).astype(np.int64) * offset
+
+    def value(self, index: np.ndarray) -> np.ndarray:
+        """Representative value of each bin"""
+        offset = index - self.zero_bin
+        keys = np.abs(offset) - 1 + self.key_min
+        magnitude = 2 * self.gamma**keys / (self.gamma + 1)
+        return np.where(offset == 0, 0.0, np.sign(offset) * magnitude)
+
+
+@dataclass
+class Moments:
+    """Running count, mean and sum of squared deviations, per slot"""
+
+    count: np.ndarray
+    mean: np.ndarray
+    m2: np.ndarray
+
+    @classmethod
+    def zeros(cls, n: int) -> "Moments":
+        return cls(count=np.zeros(n), mean=np.zeros(n), m2=np.zeros(n))
+
+    @classmethod
+    def from_values(cls, slot: np.ndarray, x: np.ndarray, n: int) -> "Moments":
+        count = np.bincount(slot, minlength=n).astype(float)
+        with np.errstate(invalid="ignore"):
+            mean = np.nan_to_num(np.bincount(slot, weights=x, minlength=n) / count)
+        m2 = np.bincount(slot, weights=(x - mean[slot]) ** 2, minlength=n)
+        return cls(count=count, mean=mean, m2=m2)
+
+    def merge(self, other: "Moments"):
+        count = self.count + other.count
+        with np.errstate(invalid="ignore"):
+            weight = np.nan_to_num(other.count / count)
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + other.m2 + delta**2 * self.count * weight
+        self.count = count
+
+    @property
+    def variance(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    @property
+    def standard_error(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(self.variance / self.count)
+
+
+@dataclass
+class CoMoments:
+    """Running count, mean vector and matrix of summed cross-deviations of vectors"""
+
+    count: float
+    mean: np.ndarray
+    m2: np.ndarray
+
+    @classmethod
+    def zeros(cls, k: int) -> "CoMoments":
+        return cls(count=0.0, mean=np.zeros(k), m2=np.zeros((k, k)))
+
+    @classmethod
+    def from_values(cls, z: np.ndarray) -> "CoMoments":
+        """From the rows of z, shape (n, k)"""
+        mean = z.mean(axis=0) if len(z) else np.zeros(z.shape[1])
+        deviations = z - mean
+        return cls(count=float(len(z)), mean=mean, m2=deviations.T @ deviations)
+
+    def merge(self, other: "CoMoments"):
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        weight = self.count * other.count / count
+        self.m2 = self.m2 + other.m2 + np.outer(delta, delta) * weight
+        self.count = count
+
+    @property
+    def covariance(self) -> np.ndarray:
+        if self.count < 2:
+            return np.full_like(self.m2, np.nan)
+        return self.m2 / (self.count - 1)
+
+
+@dataclass
+class LifetimeUtilityEstimator:
+    """Estimates of expected lifetime utility and of a consumption certainty
+    equivalent, with standard errors.
+
+    Along with each path's lifetime utility, two control variates with known
+    expectations are tracked: the path's risky returns minus `expected_return`, summed
+    over the years it was alive (expectation 0), and the number of those years
+    (expectation `expected_years`, from the life table).
+
+    The certainty equivalent is the constant annual consumption (post-tax,
+    post-inflation) with the same expected `crra_utility`, at `gamma` and discounted at
+    `rate_time_preference`, as the simulated consumption over the same lifetimes. It
+    leaves out the bequest.
+
+    Standard errors allow for `sampling`: antithetic pairs of paths are averaged into
+    one observation, and with SOBOL the errors come from the spread between the
+    independently scrambled blocks of `replicate_size` paths.
+    """
+
+    expected_return: float
+    expected_years: float
+    gamma: float = 2.0
+    rate_time_preference: float = 0.02
+    sampling: SamplingMethod = SamplingMethod.PSEUDO_RANDOM
+    replicate_size: int | None = None
+
+    # Columns of the tracked vectors
+    UTILITY, EXCESS_RETURN, N_YEARS, CONSUMPTION_UTILITY, DISCOUNTED_YEARS = range(5)
+
+    def __post_init__(self):
+        self.moments = CoMoments.zeros(5)
+        # Replicate index -> sums of (1, tracked vector), for SOBOL
+        self.replicate_sums: dict[int, np.ndarray] = {}
+
+    def consumption_terms(
+        self, year: np.ndarray, consumption: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Elementwise discounted utility of `consumption` in simulated `year`, and the
+        discount itself; both zero where consumption is NaN. Summed over a path's years,
+        these give `update`'s `consumption_utility` and `discounted_years`."""
+        discount = (1 + self.rate_time_preference) ** -np.asarray(year, dtype=float)
+        consumed = ~np.isnan(consumption)
+        u = crra_utility(np.where(consumed, consumption, 1.0), gamma=self.gamma)
+        return np.where(consumed, u * discount, 0.0), np.where(consumed, discount, 0.0)
+
+    def update(
+        self,
+        *,
+        run_index: np.ndarray,
+        total_utility: np.ndarray,
+        risky_return_sum: np.ndarray,
+        n_years: np.ndarray,
+        consumption_utility: np.ndarray,
+        discounted_years: np.ndarray,
+    ):
+        """Add paths `run_index`, given their lifetime utility, the sum and number of
+        their risky returns, and their summed `consumption_terms`"""
+        excess_return = risky_return_sum - n_years * self.expected_return
+        z = np.column_stack(
+            [total_utility, excess_return, n_years, consumption_utility, discounted_years]
+        ).astype(float)
+        if self.sampling == SamplingMethod.ANTITHETIC:
+            if len(run_index) % 2 or run_index[0] % 2:
+                raise ValueError("Antithetic paths must be added in whole pairs")
+            units = z.reshape(-1, 2, z.shape[1]).mean(axis=1)
+        else:
+            units = z
+        self.moments.merge(CoMoments.from_values(units))
+
+        if self.sampling == SamplingMethod.SOBOL:
+            replicate = run_index // (self.replicate_size or np.iinfo(np.int64).max)
+            for r in np.unique(replicate):
+                rows = z[replicate == r]
+                sums = np.concatenate([[len(rows)], rows.sum(axis=0)])
+                self.replicate_sums[int(r)] = self.replicate_sums.get(int(r), 0) + sums
+
+    def merge(self, other: "LifetimeUtilityEstimator"):
+        self.moments.merge(other.moments)
+        for r, sums in other.replicate_sums.items():
+            self.replicate_sums[r] = self.replicate_sums.get(r, 0) + sums
+
+    def _standard_error(self, weights: np.ndarray) -> float:
+        """Standard error of `weights` @ (mean of the tracked vectors)"""
+        if self.sampling == SamplingMethod.SOBOL:
+            sums = np.array(list(self.replicate_sums.values()))
+            if len(sums) < 2:
+                return np.nan
+            replicate_estimates = (sums[:, 1:] / sums[:, :1]) @ weights
+            return replicate_estimates.std(ddof=1) / np.sqrt(len(sums))
+        covariance = self.moments.covariance
+        return np.sqrt(weights @ covariance @ weights / self.moments.count)
+
+    def estimate(self, control_variates: bool = False) -> tuple[float, float]:
+        """(estimate, standard error) of expected lifetime utility. With
+        `control_variates`, the estimate is adjusted by the regression of utility on the
+        controls' deviations from their known expectations."""
+        controls = [self.EXCESS_RETURN, self.N_YEARS]
+        control_means = np.array([0.0, self.expected_years])
+        beta = np.zeros(2)
+        if control_variates:
+            covariance = self.moments.covariance
+            # lstsq copes with a control that doesn't vary (e.g. fixed lifetimes)
+            beta = np.linalg.lstsq(
+                covariance[np.ix_(controls, controls)],
+                covariance[controls, self.UTILITY],
+                rcond=None,
+            )[0]
+        weights = np.zeros(len(self.moments.mean))
+        weights[self.UTILITY] = 1.0
+        weights[controls] = -beta
+        estimate = weights @ self.moments.mean + beta @ control_means
+        return float(estimate), float(self._standard_error(weights))
+
+    def certainty_equivalent(self) -> tuple[float, float]:
+        """(estimate, standard error) of the consumption certainty equivalent"""
+        mean = self.moments.mean
+        # Utility of the constant consumption level, per discounted year
+        utility_per_year = mean[self.CONSUMPTION_UTILITY] / mean[self.DISCOUNTED_YEARS]
+        # The certainty equivalent "return" on wealth 1 is the certainty equivalent
+        # wealth - 1
+        ce = 1.0 + certainty_equivalent_return(
+            initial_wealth=1.0, expected_utility=utility_per_year, gamma=self.gamma
+        )
+        # Delta method: linearise the ratio of means, then d(ce)/du = 1 / u'(ce)
+        weights = np.zeros(len(mean))
+        weights[self.CONSUMPTION_UTILITY] = 1.0
+        weights[self.DISCOUNTED_YEARS] = -utility_per_year
+        weights *= ce**self.gamma / mean[self.DISCOUNTED_YEARS]
+        return float(ce), float(self._standard_error(weights))
+
+
+@dataclass
+class SimulationSummary:
+    """Per-age quantile sketches and moments of `metrics` (moments only for
+    `UTILITY_METRICS`), plus moments of each path's lifetime `total_utility`. Can be
+    plotted directly with `findec.visualise.quantile_lineplot`.
+
+    If an `estimator` is given, it is updated too; see `expected_utility`.
+    """
+
+    ages: np.ndarray
+    metrics: list[str] = field(default_factory=lambda: list(METRICS_DEFAULT))
+    bins: LogBins = field(default_factory=LogBins)
+    estimator: LifetimeUtilityEstimator | None = None
+
+    def __post_init__(self):
+        self.ages = np.asarray(self.ages)
+        n_ages = len(self.ages)
+        self.counts = {
+            m: np.zeros((n_ages, self.bins.n_bins), dtype=np.int64)
+            for m in self.quantile_metrics
+        }
+        self.moments = {m: Moments.zeros(n_ages) for m in self.metrics}
+        self.lifetime_utility = Moments.zeros(1)
+
+    @property
+    def n_paths(self) -> int:
+        return int(self.lifetime_utility.count[0])
+
+    @property
+    def quantile_metrics(self) -> list[str]:
+        """The metrics with quantile sketches"""
+        return [m for m in self.metrics if m not in UTILITY_METRICS]
+
+    def _update(self, age_index: np.ndarray, columns: dict[str, np.ndarray]):
+        n_ages = len(self.ages)
+        for m in self.metrics:
+            x = columns[m]
+            keep = ~np.isnan(x)
+            slot, x = age_index[keep], x[keep]
+            if m in self.counts:
+                flat = slot * self.bins.n_bins + self.bins.index(x)
+                self.counts[m] += np.bincount(
+                    flat, minlength=self.counts[m].size
+                ).reshape(self.counts[m].shape)
+            self.moments[m].merge(Moments.from_values(slot, x, n_ages))
+
+    def _update_lifetime(self, total_utility: np.ndarray):
+        self.lifetime_utility.merge(
+            Moments.from_values(np.zeros(len(total_utility), dtype=np.int64), total_utility, 1)
+        )
+
+    def update_frame(self, df: pl.DataFrame):
+        """Add the paths in a frame produced by `simulate_life_paths`"""
+        age_index = df["age"].to_numpy() - self.ages[0]
+        columns = {
+            m: df[m].cast(pl.Float64).fill_null(np.nan).to_numpy() for m in self.metrics
+        }
+        self._update(age_index, columns)
+        final = df.group_by("run_number", maintain_order=True).agg(
+            pl.col("total_utility").last()
+        )
+        self._update_lifetime(final["total_utility"].to_numpy())
+        if self.estimator is not None:
+            consumption = (
+                df["consumption_post_tax_post_inflation"].fill_null(np.nan).to_numpy()
+            )
+            u, d = self.estimator.consumption_terms(age_index, consumption)
+            paths = df.with_columns(
+                pl.Series("consumption_utility", u), pl.Series("discounted_years", d)
+            ).group_by("run_number", maintain_order=True).agg(
+                pl.col("total_utility").last(),
+                pl.col("risky_return").sum().alias("risky_return_sum"),
+                pl.col("risky_return").count().alias("n_years"),
+                pl.col("consumption_utility").sum(),
+                pl.col("discounted_years").sum(),
+            )
+            self.estimator.update(
+                run_index=paths["run_number"].cast(pl.Int64).to_numpy(),
+                total_utility=paths["total_utility"].to_numpy(),
+                risky_return_sum=paths["risky_return_sum"].to_numpy(),
+                n_years=paths["n_years"].to_numpy(),
+                consumption_utility=paths["consumption_utility"].to_numpy(),
+                discounted_years=paths["discounted_years"].to_numpy(),
+            )
+
+    def update_batch(self, batch: StateBatch):
+        """Add the paths in a `StateBatch`, without building a frame"""
+        recorded = batch.recorded
+        age_index = np.broadcast_to(
+            (batch.ages - self.ages[0])[:, None], recorded.shape
+        )[recorded]
+        self._update(age_index, {m: getattr(batch, m)[recorded] for m in self.metrics})
+        total_utility = batch.total_utility[batch.last_index, np.arange(batch.n_paths)]
+        self._update_lifetime(total_utility)
+        if self.estimator is not None:
+            u, d = self.estimator.consumption_terms(
+                np.arange(len(batch.ages))[:, None],
+                batch.consumption_post_tax_post_inflation,
+            )
+            self.estimator.update(
+                run_index=batch.run_offset + np.arange(batch.n_paths),
+                total_utility=total_utility,
+                risky_return_sum=np.nansum(batch.risky_return, axis=0),
+                n_years=(~np.isnan(batch.risky_return)).sum(axis=0),
+                consumption_utility=u.sum(axis=0),
+                discounted_years=d.sum(axis=0),
+            )
+
+    def merge(self, other: "SimulationSummary") -> "SimulationSummary":
+        for m in self.metrics:
+            if m in self.counts:
+                self.counts[m] += other.counts[m]
+            self.moments[m].merge(other.moments[m])
+        self.lifetime_utility.merge(other.lifetime_utility)
+        if self.estimator is not None and other.estimator is not None:
+            self.estimator.merge(other.estimator)
+        return self
+
+    def quantile(self, metric: str, q: float) -> np.ndarray:
+        """Per-age q-quantile of `metric`, with relative error at most
+        `bins.relative_accuracy`. NaN for ages that no path reached. Utility metrics
+        have no quantiles; simulate a frame for those."""
+        if metric in UTILITY_METRICS:
+            raise ValueError(
+                f"{metric} has no quantile sketch, only moments: utilities cluster too "
+                "tightly for bins of fixed relative width"
+            )
+        counts = self.counts[metric]
+        cumulative = counts.cumsum(axis=1)
+        total = cumulative[:, -1]
+        rank = np.floor(q * (total - 1) + 0.5)
+        index = (cumulative <= rank[:, None]).sum(axis=1)
+        values = self.bins.value(np.minimum(index, self.bins.n_bins - 1))
+        return np.where(total > 0, values, np.nan)
+
+    def quantile_frame(self, metric: str, quantiles: list[float]) -> pl.DataFrame:
+        """Frame with the same layout as the quantiles in `quantile_lineplot`. Pass no
+        `quantiles` for the moments of a utility metric."""
+        moments = self.moments[metric]
+        return pl.DataFrame(
+            {
+                "age": self.ages,
+                **{f"q_{q:.2f}": self.quantile(metric, q) for q in quantiles},
+                "mean": moments.mean,
+                "std": np.sqrt(moments.variance),
+                "count": moments.count.astype(np.int64),
+            }
+        ).filter(pl.col("count") > 0)
+
+    def expected_utility(self, control_variates: bool = False) -> tuple[float, float]:
+        """(estimate, standard error) of expected lifetime utility, from the `estimator`
+        if there is one. Otherwise the paths are taken to be independent."""
+        if self.estimator is not None:
+            return self.estimator.estimate(control_variates=control_variates)
+        if control_variates:
+            raise ValueError("Control variates need a LifetimeUtilityEstimator")
+        return self.total_utility_mean, self.total_utility_standard_error
+
+    def certainty_equivalent(self) -> tuple[float, float]:
+        """(estimate, standard error) of the consumption certainty equivalent; see
+        `LifetimeUtilityEstimator`"""
+        if self.estimator is None:
+            raise ValueError("The certainty equivalent needs a LifetimeUtilityEstimator")
+        return self.estimator.certainty_equivalent()
+
+    @property
+    def total_utility_mean(self) -> float:
+        return float(self.lifetime_utility.mean[0])
+
+    @property
+    def total_utility_std(self) -> float:
+        return float(np.sqrt(self.lifetime_utility.variance[0]))
+
+    @property
+    def total_utility_standard_error(self) -> float:
+        return float(self.lifetime_utility.standard_error[0])
@@ -2,6 +2,10 @@
 From https://www.ssa.gov/oact/STATS/table4c6.html
 """
 
+from dataclasses import dataclass, field
+
+import numpy as np
+
 age_to_death_probability_male: dict[int, float] = {
     0: 0.005860,
     1: 0.000420,
@@ -496,3 +500,73 @@ age_to_life_expectancy_female: dict[int, float] = {
     118: 0.65,
     119: 0.6,
 }
+
+
+@dataclass
+class MortalityTable:
+    """Period life table as arrays indexed by age.
+
+    As in the simulation, someone alive at `starting_age` dies in year k >= 1 (i.e. at
+    age starting_age + k) with probability `death_probability[starting_age + k]`, given
+    they survived the previous years.
+    """
+
+    death_probability: np.ndarray
+    life_expectancy: np.ndarray
+    cumulative_survival: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # cumulative_survival[a] = prod_{j <= a} (1 - q_j), so that survival from any
+        # starting age is a ratio of two entries
+        self.cumulative_survival = np.cumprod(1 - self.death_probability)
+
+    @classmethod
+    def from_dicts(
+        cls, death_probability: dict[int, float], life_expectancy: dict[int, float]
+    ) -> "MortalityTable":
+        ages = range(len(death_probability))
+        return cls(
+            death_probability=np.array([death_probability[a] for a in ages]),
+            life_expectancy=np.array([life_expectancy[a] for a in ages]),
+        )
+
+    @property
+    def max_age(self) -> int:
+        return len(self.death_probability) - 1
+
+    def survival_curve(self, starting_age: int) -> np.ndarray:
+        """Probability of being alive k = 0..max_age - starting_age years later"""
+        return (
+            self.cumulative_survival[starting_age:]
+            / self.cumulative_survival[starting_age]
+        )
+
+    def sample_death_age(
+        self, *, starting_age: int, n: int, rng: np.random.Generator | None = None
+    ) -> np.ndarray:
+        """Draw the age at death of `n` people alive at `starting_age` with one inverse-CDF
+        lookup each. People who outlive the table get `max_age + 1`."""
+        u = np.random.random(n) if rng is None else rng.random(n)
+        return self.death_age_from_uniform(starting_age=starting_age, u=u)
+
+    def death_age_from_uniform(self, *, starting_age: int, u: np.ndarray) -> np.ndarray:
+        """Inverse CDF of the age at death, for uniforms `u` in [0, 1)"""
+        cdf = 1 - self.survival_curve(starting_age)
+        return starting_age + np.searchsorted(cdf, u, side="right")
+
+    def expected_years_alive(self, *, starting_age: int, n_years: int) -> float:
+        """Expected number of the years 1..n_years after `starting_age` that are reached
+        alive"""
+        return float(self.survival_curve(starting_age)[1 : n_years + 1].sum())
+
+
+mortality_male = MortalityTable.from_dicts(
+    age_to_death_probability_male, age_to_life_expectancy_male
+)
+mortality_female = MortalityTable.from_dicts(
+    age_to_death_probability_female, age_to_life_expectancy_female
+)
+
+
+def mortality_table(is_male: bool) -> MortalityTable:
+    return mortality_male if is_male else mortality_female
@@ -0,0 +1,195 @@
+"""Parameter sweeps with common random numbers.
+
+Every configuration in a sweep is simulated with the batch engine against the same
+`ScenarioBank`, so they all see the same market returns (up to their own return
+parameters) and the same lifetimes. Differences between configurations then reflect the
+parameters rather than sampling noise.
+"""
+
+import itertools
+from collections.abc import Mapping, Sequence
+from dataclasses import fields, replace
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from findec.batch import simulate_life_paths_batch
+from findec.dataclasses import Preferences
+from findec.returns import DistributionType, RiskyAsset, SamplingMethod
+from findec.scenarios import ScenarioBank
+from findec.summary import LifetimeUtilityEstimator
+from findec.survival import mortality_table
+
+PREFERENCE_FIELDS = {f.name for f in fields(Preferences)}
+
+# Changing these changes the shape of the scenario bank, so they can't be swept
+BANK_PARAMETERS = {
+    "n_paths",
+    "starting_age",
+    "is_male",
+    "with_longevity_uncertainty",
+    "time_horizon_max",
+}
+
+
+def configurations(grid: Mapping[str, Sequence]) -> list[dict]:
+    """Every combination of the values in `grid`, in row-major order"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def _total_utility(
+    *,
+    scenarios: ScenarioBank,
+    batch_size: int,
+    estimator: LifetimeUtilityEstimator,
+    **kwargs,
+) -> np.ndarray:
+    """Lifetime utility of every path in the bank. The paths are also added to
+    `estimator`."""
+    total_utility = []
+    for start in range(0, scenarios.n_paths, batch_size):
+        chunk = scenarios.paths(start, min(start + batch_size, scenarios.n_paths))
+        batch = simulate_life_paths_batch(
+            n_paths=chunk.n_paths,
+            starting_age=scenarios.starting_age,
+            scenarios=chunk,
+            **kwargs,
+        )
+        paths = np.arange(batch.n_paths)
+        total_utility.append(batch.total_utility[batch.last_index, paths])
+        u, d = estimator.consumption_terms(
+            np.arange(len(batch.ages))[:, None], batch.consumption_post_tax_post_inflation
+        )
+        estimator.update(
+            run_index=start + paths,
+            total_utility=total_utility[-1],
+            risky_return_sum=np.nansum(batch.risky_return, axis=0),
+            n_years=(~np.isnan(batch.risky_return)).sum(axis=0),
+            consumption_utility=u.sum(axis=0),
+            discounted_years=d.sum(axis=0),
+        )
+    return np.concatenate(total_utility)
+
+
+def sweep(
+    grid: Mapping[str, Sequence],
+    *,
+    n_sims: int | None = None,
+    rng_seed: int = 0,
+    batch_size: int = 10_000,
+    quantiles: Sequence[float] = (0.05, 0.5, 0.95),
+    scenarios: ScenarioBank | str | Path | None = None,
+    sampling: SamplingMethod = SamplingMethod.PSEUDO_RANDOM,
+    **kwargs,
+) -> pl.DataFrame:
+    """Simulate every configuration in `grid` against one shared bank of return shocks
+    and lifetimes, and summarise each configuration's lifetime utility in one row.
+
+    `grid` maps argument names of `simulate_life_paths_batch`, or fields of
+    `Preferences`, to the values to sweep. The remaining keyword arguments are passed on
+    to `simulate_life_paths_batch` for every configuration. A bank of `n_sims` paths is
+    drawn from `rng_seed` with `sampling`, unless `scenarios` (a bank, or the directory
+    of one written with `ScenarioBank.write`) is given; every path in it is simulated, so
+    `n_sims`, if also given, must be its number of paths. A given bank's `is_male` and
+    `with_longevity_uncertainty` are used unless passed, which must then match.
+
+    Expected utility is reported as a plain and as a control-variate estimate, and the
+    consumption certainty equivalent (at gamma_above_subsistence) as a plain estimate,
+    each with a standard error; see `findec.summary.LifetimeUtilityEstimator`.
+    """
+    if clashes := BANK_PARAMETERS & set(grid):
+        raise ValueError(
+            f"{sorted(clashes)} set the shape of the shared scenario bank and can't be swept"
+        )
+    if scenarios is None and n_sims is None:
+        raise ValueError("Either n_sims or scenarios must be given")
+    if isinstance(scenarios, (str, Path)):
+        scenarios = ScenarioBank.open(scenarios)
+    if scenarios is not None and n_sims is not None and n_sims != scenarios.n_paths:
+        raise ValueError(
+            f"n_sims={n_sims} doesn't match the {scenarios.n_paths} paths in the bank; "
+            "every path of a given bank is simulated"
+        )
+    if scenarios is None:
+        scenarios = ScenarioBank.draw(
+            n_paths=n_sims,
+            time_horizon_max=kwargs["time_horizon_max"],
+            rng=np.random.default_rng(rng_seed),
+            starting_age=kwargs.get("starting_age", 65),
+            is_male=kwargs.get("is_male", False),
+            with_longevity_uncertainty=kwargs.get("with_longevity_uncertainty", True),
+            sampling=sampling,
+            block_size=batch_size,
+        )
+    kwargs.pop("starting_age", None)
+    # Lifetimes come from the bank, so its flags apply unless given (and then must match)
+    kwargs.setdefault("is_male", scenarios.is_male)
+    kwargs.setdefault("with_longevity_uncertainty", scenarios.with_longevity_uncertainty)
+    scenarios.check_mortality(
+        is_male=kwargs["is_male"],
+        with_longevity_uncertainty=kwargs["with_longevity_uncertainty"],
+    )
+    if scenarios.with_longevity_uncertainty:
+        expected_years = mortality_table(scenarios.is_male).expected_years_alive(
+            starting_age=scenarios.starting_age, n_years=kwargs["time_horizon_max"]
+        )
+    else:
+        expected_years = kwargs["time_horizon_max"]
+
+    rows = []
+    for config in configurations(grid):
+        pref = replace(
+            kwargs["pref"],
+            **{k: v for k, v in config.items() if k in PREFERENCE_FIELDS},
+        )
+        run_kwargs = {
+            **kwargs,
+            **{k: v for k, v in config.items() if k not in PREFERENCE_FIELDS},
+            "pref": pref,
+        }
+        ra = RiskyAsset(
+            expected_return=run_kwargs["expected_return_risky"],
+            standard_deviation=run_kwargs["std_dev_return_risky"],
+            distribution_type=run_kwargs.get(
+                "returns_distribution_type", DistributionType.NORMAL
+            ),
+        )
+        estimator = LifetimeUtilityEstimator(
+            expected_return=ra.mean,
+            expected_years=expected_years,
+            gamma=pref.gamma_above_subsistence,
+            rate_time_preference=pref.rate_time_preference,
+            sampling=scenarios.sampling,
+            replicate_size=scenarios.block_size,
+        )
+        total_utility = _total_utility(
+            scenarios=scenarios, batch_size=batch_size, estimator=estimator, **run_kwargs
+        )
+        expected_utility, standard_error = estimator.estimate()
+        cv_expected_utility, cv_standard_error = estimator.estimate(control_variates=True)
+        certainty_equivalent, certainty_equivalent_error = (
+            estimator.certainty_equivalent()
+        )
+        rows.append(
+            {
+                **config,
+                "n_paths": len(total_utility),
+                "expected_utility": expected_utility,
+                "expected_utility_standard_error": standard_error,
+                "expected_utility_control_variate": cv_expected_utility,
+                "expected_utility_control_variate_standard_error": cv_standard_error,
+                "certainty_equivalent_consumption": certainty_equivalent,
+                "certainty_equivalent_consumption_standard_error": (
+                    certainty_equivalent_error
+                ),
+                **{
+                    f"total_utility_q_{q:.2f}": np.quantile(
+                        total_utility, q, method="nearest"
+                    )
+                    for q in quantiles
+                },
+            }
+        )
+    return pl.DataFrame(rows)
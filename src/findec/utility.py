@@ -1,31 +1,80 @@
+import math
+
 import numpy as np
+import numpy.typing as npt
+
 from findec.dataclasses import Preferences
 
+# Utility of consumption below `eps`. Utilities that overflow the working dtype (in
+# float32, e.g. w just above eps with gamma above 5) are set to it too.
+UTILITY_FLOOR = -1e9
+
+
+def _as_output(x: np.ndarray) -> np.ndarray | float:
+    """Scalar in, scalar out"""
+    if np.ndim(x) == 0:
+        return float(x)
+    return x
+
+
+def _scalars(dtype: npt.DTypeLike, *values) -> bool:
+    """Whether to take the plain-float path: the scalar engine calls the kernels once
+    per path and year, where numpy's per-call overhead dominates"""
+    for value in values:
+        if not isinstance(value, (float, int)):
+            return False
+    return dtype is np.float64 or np.dtype(dtype) == np.float64
 
-def crra_utility(w: np.ndarray | float, *, gamma: float, eps: float = 1e-8):
+
+def crra_utility(
+    w: np.ndarray | float,
+    *,
+    gamma: np.ndarray | float,
+    eps: float = 1e-8,
+    dtype: npt.DTypeLike = np.float64,
+) -> np.ndarray | float:
     """
     Interestingly, also known as the Box-Cox transformation in stats
     https://en.wikipedia.org/wiki/Isoelastic_utility
+
+    Evaluated elementwise in `dtype`; w and gamma may be arrays of broadcastable shapes.
     """
-    if w < eps:
-        return -1e9
-    if gamma == 1:
-        return np.log(w)
-    return (1 - w ** (1 - gamma)) / (gamma - 1)
+    if _scalars(dtype, w, gamma):
+        if w < eps:
+            return UTILITY_FLOOR
+        if gamma == 1:
+            return math.log(w)
+        try:
+            return (1 - float(w) ** (1 - gamma)) / (gamma - 1)
+        except OverflowError:
+            return UTILITY_FLOOR
+    w = np.asarray(w, dtype=dtype)
+    gamma = np.asarray(gamma, dtype=dtype)
+    w_safe = np.maximum(w, eps)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        u = np.where(
+            gamma == 1, np.log(w_safe), (1 - w_safe ** (1 - gamma)) / (gamma - 1)
+        )
+    return _as_output(np.where((w < eps) | np.isneginf(u), UTILITY_FLOOR, u))
 
 
 def certainty_equivalent_return(
-    *, initial_wealth: float, expected_utility: float, gamma: float
-):
-    """Equivalent to risk-adjusted return, by definition"""
-    if gamma == 1.0:
-        certainty_equivalent_final_wealth = np.exp(expected_utility)
-    else:
-        certainty_equivalent_final_wealth = (1 - (gamma - 1) * expected_utility) ** (
-            1 / (1 - gamma)
+    *,
+    initial_wealth: np.ndarray | float,
+    expected_utility: np.ndarray | float,
+    gamma: np.ndarray | float,
+) -> np.ndarray | float:
+    """Equivalent to risk-adjusted return, by definition. Evaluated elementwise."""
+    expected_utility = np.asarray(expected_utility, dtype=float)
+    gamma = np.asarray(gamma, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        certainty_equivalent_final_wealth = np.where(
+            gamma == 1.0,
+            np.exp(expected_utility),
+            (1 - (gamma - 1) * expected_utility) ** (1 / (1 - gamma)),
         )
     certainty_equivalent_return = certainty_equivalent_final_wealth / initial_wealth - 1
-    return certainty_equivalent_return
+    return _as_output(certainty_equivalent_return)
 
 
 def get_matching_utility(
@@ -40,11 +89,12 @@ def get_matching_utility(
 
 
 def composite_crra_utility(
-    w: float,
+    w: np.ndarray | float,
     *,
     pref: Preferences,
     matching_utility: float | None = None,
-):
+    dtype: npt.DTypeLike = np.float64,
+) -> np.ndarray | float:
     """
     Piecewise CRRA:
     - If w < subsistence, treat as higher risk aversion gamma_subsistence.
@@ -57,33 +107,66 @@ def composite_crra_utility(
             gamma_above_subsistence=pref.gamma_above_subsistence,
             gamma_below_subsistence=pref.gamma_below_subsistence,
         )
-    if w < pref.w_floor:
-        return (
-            crra_utility(pref.w_floor, gamma=pref.gamma_below_subsistence)
-            + matching_utility
-        )
-
-    if w < pref.subsistence:
-        return crra_utility(w, gamma=pref.gamma_below_subsistence) + matching_utility
-    else:
+    if _scalars(dtype, w):
+        if w < pref.subsistence:
+            return (
+                crra_utility(max(w, pref.w_floor), gamma=pref.gamma_below_subsistence)
+                + matching_utility
+            )
         return crra_utility(w, gamma=pref.gamma_above_subsistence)
+    w = np.asarray(w, dtype=dtype)
+    below_subsistence = (
+        crra_utility(
+            np.maximum(w, pref.w_floor), gamma=pref.gamma_below_subsistence, dtype=dtype
+        )
+        + float(matching_utility)
+    )
+    above_subsistence = crra_utility(w, gamma=pref.gamma_above_subsistence, dtype=dtype)
+    return _as_output(np.where(w < pref.subsistence, below_subsistence, above_subsistence))
 
 
-def bequest_utility(wealth, b=10, gamma=2.0):
-    if wealth <= 0:
-        return 0.0  # or negative utility, but typically 0 is fine if no wealth
-    if b == 0:
-        return 0.0
-    return b * (1 - (wealth / b) ** (1 - gamma)) / (gamma - 1)
+def bequest_utility(
+    wealth: np.ndarray | float,
+    b: np.ndarray | float = 10,
+    gamma: np.ndarray | float = 2.0,
+    dtype: npt.DTypeLike = np.float64,
+) -> np.ndarray | float:
+    """Zero for non-positive wealth (or no bequest motive, b == 0), and the log form
+    b * log(wealth / b), the limit, at gamma == 1. Evaluated elementwise in `dtype`; b
+    may also be an array. With large gamma, wealth far below b overflows float32 sooner
+    than float64, and gets `UTILITY_FLOOR`."""
+    if _scalars(dtype, wealth, b, gamma):
+        if wealth <= 0 or b == 0:
+            return 0.0
+        if gamma == 1:
+            return b * math.log(wealth / b)
+        try:
+            return b * (1 - (float(wealth) / b) ** (1 - gamma)) / (gamma - 1)
+        except OverflowError:
+            return UTILITY_FLOOR
+    wealth = np.asarray(wealth, dtype=dtype)
+    b = np.asarray(b, dtype=dtype)
+    gamma = np.asarray(gamma, dtype=dtype)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        u = np.where(
+            gamma == 1,
+            b * np.log(wealth / b),
+            b * (1 - (wealth / b) ** (1 - gamma)) / (gamma - 1),
+        )
+    return _as_output(
+        np.where((wealth <= 0) | (b == 0), 0.0, np.where(np.isneginf(u), UTILITY_FLOOR, u))
+    )
 
 
 def wealth_to_gamma(
-    w: float,
+    w: np.ndarray | float,
     *,
     subsistence: float,
     gamma_below_subsistence: float,
     gamma_above_subsistence: float,
-) -> float:
-    if w < subsistence:
-        return gamma_below_subsistence
-    return gamma_above_subsistence
+) -> np.ndarray | float:
+    return _as_output(
+        np.where(
+            np.asarray(w) < subsistence, gamma_below_subsistence, gamma_above_subsistence
+        )
+    )
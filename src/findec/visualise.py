@@ -3,20 +3,48 @@ from polars import col
 import matplotlib.pyplot as plt
 from matplotlib.axes import Axes
 
+from findec.summary import SimulationSummary
+
 QUANTILES_DEFAULT = [0.25, 0.5, 0.75]
 
 
+# polars 1.23 replaced collect(streaming=True) with collect(engine="streaming")
+_POLARS_ENGINE_ARGUMENT = tuple(int(p) for p in pl.__version__.split(".")[:2]) >= (1, 23)
+
+
+def collect_streaming(lf: pl.LazyFrame) -> pl.DataFrame:
+    """Collect with polars' streaming engine, which doesn't load the whole input"""
+    if _POLARS_ENGINE_ARGUMENT:
+        return lf.collect(engine="streaming")
+    return lf.collect(streaming=True)
+
+
 def quantile_lineplot(
-    data: pl.DataFrame, *, x: str, y: str, quantiles: list[float] | None = None, ax: Axes | None = None
+    data: pl.DataFrame | pl.LazyFrame | SimulationSummary,
+    *,
+    x: str,
+    y: str,
+    quantiles: list[float] | None = None,
+    ax: Axes | None = None,
 ) -> Axes:
+    """Median (or other central quantile) of `y` against `x`, with a band between the
+    outer two `quantiles`. A LazyFrame, e.g. the scan returned by `simulate_life_paths`
+    with a `sink`, is aggregated with the streaming engine."""
     if quantiles is None:
         quantiles = QUANTILES_DEFAULT
 
-    df_q = (
-        data.group_by(x)
-        .agg(col(y).quantile(q).alias(f"q_{q:.2f}") for q in quantiles)
-        .sort(x)
-    )
+    if isinstance(data, SimulationSummary):
+        if x != "age":
+            raise ValueError("A SimulationSummary can only be plotted against age")
+        df_q = data.quantile_frame(y, quantiles)
+    else:
+        df_q = (
+            data.group_by(x)
+            .agg(col(y).quantile(q).alias(f"q_{q:.2f}") for q in quantiles)
+            .sort(x)
+        )
+        if isinstance(df_q, pl.LazyFrame):
+            df_q = collect_streaming(df_q)
 
     lower_quantile = quantiles[0]
     central_quantile = quantiles[1]
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from findec.dp import solve_consumption_investment, solve_sequence
+from findec.returns import RiskyAsset
+
+GAMMAS = [{"gamma": gamma} for gamma in np.linspace(1.5, 3.0, 7)]
+
+
+def test_solve_sequence_is_cold_by_default():
+    solutions = solve_sequence(solve_consumption_investment, GAMMAS[:2], n_grid=50)
+    for parameters, solution in zip(GAMMAS[:2], solutions):
+        cold = solve_consumption_investment(n_grid=50, **parameters)
+        for a, b in zip(solution[:4], cold[:4]):
+            np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize(
+    "risky_asset", [None, RiskyAsset(expected_return=0.09, standard_deviation=0.20)]
+)
+def test_warm_sweep_matches_cold_solves(risky_asset):
+    kwargs = dict(n_grid=100, risky_asset=risky_asset)
+    cold = solve_sequence(solve_consumption_investment, GAMMAS, **kwargs)
+    warm = solve_sequence(
+        solve_consumption_investment, GAMMAS, warm_start=True, **kwargs
+    )
+    for (V_cold, *_, W_grid, init_cold), (V_warm, *_, init_warm) in zip(cold, warm):
+        # A windowed search can only miss the cold optimum, never beat it
+        assert np.all(V_warm <= V_cold)
+        rich = W_grid > 1e4
+        np.testing.assert_allclose(V_warm[1:-1, rich], V_cold[1:-1, rich], rtol=1e-6)
+        assert init_warm == init_cold
@@ -0,0 +1,21 @@
+from dataclasses import asdict
+
+import polars as pl
+
+from findec.reference import reference_kwargs
+from findec.simulate import simulate_life_path, simulate_life_paths
+
+
+def test_frame_matches_path_records():
+    sims = simulate_life_paths(
+        n_sims=5, batch_size=2, rng_seed_offset=0, **reference_kwargs()
+    )
+    rows = []
+    for i in range(5):
+        record = simulate_life_path(rng_seed=i, rng_seed_offset=0, **reference_kwargs())
+        rows += [{**asdict(record[age]), "run_number": i} for age in record]
+    expected = pl.DataFrame(rows, schema=sims.schema)
+    assert sims.equals(expected)
+    # Missing values are nulls, not NaNs
+    assert sims.filter(pl.col("age") == 65)["risky_return"].is_null().all()
+    assert not sims["risky_return"].is_nan().any()
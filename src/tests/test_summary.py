@@ -0,0 +1,42 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from findec.reference import reference_kwargs
+from findec.simulate import simulate_life_paths
+
+
+@pytest.fixture(scope="module")
+def runs():
+    kwargs = dict(n_sims=500, vectorized=True, rng_seed_offset=0, **reference_kwargs())
+    return simulate_life_paths(**kwargs), simulate_life_paths(summary=True, **kwargs)
+
+
+def test_wealth_quantiles_within_relative_accuracy(runs):
+    sims, summary = runs
+    metric = "portfolio_value_post_inflation"
+    exact = (
+        sims.group_by("age")
+        .agg(pl.col(metric).quantile(0.5, interpolation="nearest"))
+        .sort("age")
+    )
+    sketched = summary.quantile_frame(metric, [0.5])
+    assert sketched["age"].to_list() == exact["age"].to_list()
+    np.testing.assert_allclose(
+        sketched["q_0.50"], exact[metric], rtol=summary.bins.relative_accuracy
+    )
+
+
+def test_utilities_have_moments_only(runs):
+    sims, summary = runs
+    assert "annual_utility" not in summary.quantile_metrics
+    with pytest.raises(ValueError, match="no quantile sketch"):
+        summary.quantile("annual_utility", 0.5)
+    moments = summary.quantile_frame("annual_utility", [])
+    exact = (
+        sims.drop_nulls("annual_utility")
+        .group_by("age")
+        .agg(pl.col("annual_utility").mean())
+        .sort("age")
+    )
+    np.testing.assert_allclose(moments["mean"], exact["annual_utility"], rtol=1e-9)
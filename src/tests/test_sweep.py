@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from findec.reference import reference_kwargs
+from findec.scenarios import ScenarioBank
+from findec.sweep import sweep
+
+
+def test_sweep_matches_bank_size():
+    kwargs = reference_kwargs()
+    bank = ScenarioBank.draw(
+        n_paths=20,
+        time_horizon_max=kwargs["time_horizon_max"],
+        rng=np.random.default_rng(0),
+    )
+    grid = {"gamma_above_subsistence": [2.0, 3.0]}
+    assert len(sweep(grid, scenarios=bank, **kwargs)) == 2
+    assert len(sweep(grid, n_sims=20, scenarios=bank, **kwargs)) == 2
+    with pytest.raises(ValueError, match="n_sims=10"):
+        sweep(grid, n_sims=10, scenarios=bank, **kwargs)
+    with pytest.raises(ValueError, match="n_sims or scenarios"):
+        sweep(grid, **kwargs)
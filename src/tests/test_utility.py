@@ -0,0 +1,24 @@
+import math
+
+import numpy as np
+import pytest
+
+from findec.utility import bequest_utility
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_bequest_utility_log_form_at_gamma_one(dtype):
+    wealth = np.array([0.0, 5.0, 10.0, 1_000.0])
+    expected = [0.0, 10 * math.log(0.5), 0.0, 10 * math.log(100.0)]
+    assert bequest_utility(wealth, b=10, gamma=1.0, dtype=dtype) == pytest.approx(
+        expected, rel=1e-6
+    )
+    # The scalar path agrees, and so does gamma just off 1
+    for w, u in zip(wealth, expected):
+        assert bequest_utility(float(w), b=10, gamma=1.0) == pytest.approx(u)
+        assert bequest_utility(float(w), b=10, gamma=1.0 + 1e-7) == pytest.approx(
+            u, abs=1e-4
+        )
+    # Gamma as an array, mixing the log and power forms
+    u = bequest_utility(1_000.0 * np.ones(2), b=10, gamma=np.array([1.0, 2.0]))
+    assert u == pytest.approx([10 * math.log(100.0), 10 * (1 - 0.01)])
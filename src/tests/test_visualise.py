@@ -0,0 +1,34 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import polars as pl
+import pytest
+
+from findec.simulate import simulate_life_paths
+from findec.reference import reference_kwargs
+from findec.visualise import collect_streaming, quantile_lineplot
+
+
+@pytest.fixture(scope="module")
+def sims() -> pl.DataFrame:
+    return simulate_life_paths(
+        n_sims=200, vectorized=True, rng_seed_offset=0, **reference_kwargs()
+    )
+
+
+def test_run_numbers_are_integers(sims):
+    assert sims.schema["run_number"] == pl.Int64
+
+
+def test_collect_streaming(sims):
+    lf = sims.lazy().group_by("age").agg(pl.len()).sort("age")
+    assert collect_streaming(lf).equals(sims.group_by("age").agg(pl.len()).sort("age"))
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_quantile_lineplot(sims, lazy):
+    data = sims.lazy() if lazy else sims
+    ax = quantile_lineplot(data, x="age", y="portfolio_value_post_inflation")
+    median = sims.group_by("age").agg(pl.col("portfolio_value_post_inflation").median())
+    assert len(ax.lines[0].get_xdata()) == len(median)